@@ -0,0 +1,237 @@
+"""
+Offline sync benchmarks.
+
+Fake youtube-dl/ffprobe/ffmpeg executables (see fakes.py) are put on PATH, so
+benchmarks run without network access. Measured:
+
+> sync: YTAudio.yt_audio end to end (first sync, then repeat sync with nothing new)
+
+> filter: YTAudio.filter_download_urls in archive and metadata mode, for
+library sizes (archive lines/files in save directory) x playlist sizes
+
+> throttle: sync of two playlists with rate limiter, first info request of
+each playlist is throttled (HTTP 429) and retried after THROTTLE_PAUSE
+
+Usage:
+    $ python -m benchmarks.bench_sync [--playlist-sizes 10,100] [--library-sizes 100,1000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path, PurePath
+
+from benchmarks import fakes
+
+CONFIG = '''[DEFAULT]
+OUTPUT_DIRECTORY = {output}
+USE_ARCHIVE = 0
+USE_METADATA = 0
+URL_LIST = []
+THROTTLE_PAUSE = {throttle_pause}
+'''
+
+# Pause of rate limiter after throttling (seconds)
+THROTTLE_PAUSE = 0.5
+
+
+def expect(name, actual, expected):
+    """
+    Fail benchmark if a result is wrong (timing of a broken sync is meaningless)
+    """
+    if actual != expected:
+        raise AssertionError('{0}: expected {1}, got {2}'.format(name, expected, actual))
+
+
+class Benchmark:
+    """
+    Benchmark environment (fake executables, config, cache and output directories)
+    """
+
+    def __init__(self, directory, latency=0.0, audio_format='mp3'):
+        self.directory = directory
+        self.output = str(PurePath(directory, 'output'))
+        fakes.install_fakes(str(PurePath(directory, 'bin')))
+        Path(directory, 'config', 'yt-audio').mkdir(parents=True, exist_ok=True)
+        Path(directory, 'config', 'yt-audio', 'config.ini').write_text(
+            CONFIG.format(output=self.output, throttle_pause=THROTTLE_PAUSE))
+        os.environ['PATH'] = str(PurePath(directory, 'bin')) + os.pathsep + os.environ['PATH']
+        os.environ['XDG_CONFIG_HOME'] = str(PurePath(directory, 'config'))
+        os.environ['XDG_CACHE_HOME'] = str(PurePath(directory, 'cache'))
+        os.environ['FAKE_LATENCY'] = str(latency)
+        os.environ['FAKE_AUDIO_FORMAT'] = audio_format
+        os.environ['FAKE_STATE'] = str(PurePath(directory, 'state'))
+        self.audio_format = audio_format
+
+    def reset_output(self):
+        shutil.rmtree(self.output, ignore_errors=True)
+        shutil.rmtree(str(PurePath(self.directory, 'cache')), ignore_errors=True)
+        shutil.rmtree(os.environ['FAKE_STATE'], ignore_errors=True)
+        Path(os.environ['FAKE_STATE']).mkdir(parents=True)
+
+    def ytaudio(self, argv):
+        """
+        Create YTAudio instance for CLI arguments
+        """
+        from yt_audio.YTAudio import YTAudio
+        _argv = sys.argv
+        sys.argv = ['yt-audio'] + argv
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                return YTAudio()
+        finally:
+            sys.argv = _argv
+
+    @staticmethod
+    def timed(function, *args):
+        _output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(_output):
+            result = function(*args)
+        return time.perf_counter() - start, result, _output.getvalue()
+
+    def bench_sync(self, playlist_size, mode):
+        """
+        Time first and repeat sync of a single playlist
+        """
+        self.reset_output()
+        os.environ['FAKE_PLAYLIST_SIZE'] = str(playlist_size)
+        url = 'https://www.youtube.com/playlist?list=s{0}'.format(playlist_size)
+        results = {}
+        for run in ('first', 'repeat'):
+            ytaudio = self.ytaudio(['--use-' + mode, url])
+            elapsed, _, output = self.timed(ytaudio.yt_audio)
+            _files = [x for x in Path(self.output).rglob('*.*') if x.suffix in ('.mp3', '.raw')]
+            results[run] = {'seconds': elapsed, 'errors': output.count('Error:'),
+                            'files': len(_files)}
+            expect('sync {0} {1} files'.format(mode, run), len(_files), playlist_size)
+            expect('sync {0} {1} errors'.format(mode, run), results[run]['errors'], 0)
+        return results
+
+    def bench_throttle(self, playlist_size, mode):
+        """
+        Time sync of two playlists with rate limiter while first info request of
+        each playlist is throttled, in batch and stream mode
+        """
+        os.environ['FAKE_PLAYLIST_SIZE'] = str(playlist_size)
+        os.environ['FAKE_THROTTLE'] = '1'
+        urls = ['https://www.youtube.com/playlist?list=t{0}{1}'.format(x, playlist_size)
+                for x in ('a', 'b')]
+        results = {}
+        try:
+            for run in ('batch', 'stream'):
+                self.reset_output()
+                argv = ['--use-' + mode, '--rate-limit'] + (['--stream'] if run == 'stream' else [])
+                ytaudio = self.ytaudio(argv + urls)
+                elapsed, _, output = self.timed(ytaudio.yt_audio)
+                _files = [x for x in Path(self.output).rglob('*.*') if x.suffix in ('.mp3', '.raw')]
+                results[run] = {'seconds': elapsed, 'errors': output.count('Error:'),
+                                'files': len(_files), 'throttles': output.count('Throttled')}
+                expect('throttle {0} {1} files'.format(mode, run), len(_files), 2 * playlist_size)
+                expect('throttle {0} {1} errors'.format(mode, run), results[run]['errors'], 0)
+                expect('throttle {0} {1} throttled'.format(mode, run), results[run]['throttles'] > 0, True)
+        finally:
+            os.environ['FAKE_THROTTLE'] = '0'
+        return results
+
+    def build_library(self, path, library_size, mode):
+        """
+        Create save directory with library_size downloaded titles
+        """
+        Path(path).mkdir(parents=True, exist_ok=True)
+        if mode == 'archive':
+            with open(str(PurePath(path, 'records.txt')), 'w') as archive:
+                for i in range(library_size):
+                    archive.write('youtube {0}\n'.format(fakes.video_id('lib', i)))
+        else:
+            extension = 'mp3' if self.audio_format == 'mp3' else 'raw'
+            for i in range(library_size):
+                _id = fakes.video_id('lib', i)
+                fakes.write_audio(str(PurePath(path, '{0}.{1}'.format(_id, extension))),
+                                  fakes.BASE_URL + _id, _id, self.audio_format, size=512)
+
+    def bench_filter(self, library_size, playlist_size, mode):
+        """
+        Time filter_download_urls; half of playlist is already in library
+        """
+        self.reset_output()
+        path = str(PurePath(self.output, 'library'))
+        self.build_library(path, library_size, mode)
+        _half = playlist_size // 2
+        url_list = [fakes.BASE_URL + fakes.video_id('lib', i) for i in range(_half)]
+        url_list = url_list + [fakes.BASE_URL + fakes.video_id('new', i)
+                               for i in range(playlist_size - _half)]
+        results = {}
+        # Warm run reuses instance (in-memory archive index) and on-disk probe cache
+        ytaudio = self.ytaudio(['--use-' + mode, 'https://www.youtube.com/watch?v=x'])
+        for run in ('cold', 'warm'):
+            elapsed, pending, _ = self.timed(ytaudio.filter_download_urls, path,
+                                             list(url_list), ytaudio.archive_file)
+            results[run] = {'seconds': elapsed, 'pending': len(pending)}
+            expect('filter {0} {1} pending'.format(mode, run), len(pending), playlist_size - _half)
+        return results
+
+
+def _sizes(value):
+    return [int(x) for x in value.split(',') if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='yt-audio offline benchmarks')
+    parser.add_argument('--playlist-sizes', type=_sizes, default=[10, 100, 1000, 10000])
+    parser.add_argument('--library-sizes', type=_sizes, default=[100, 1000, 10000, 50000])
+    parser.add_argument('--modes', default='archive,metadata')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='fake per-request/per-title latency (seconds)')
+    parser.add_argument('--audio-format', choices=['mp3', 'raw'], default='mp3',
+                        help="'raw' files can only be read by (fake) ffprobe")
+    parser.add_argument('--skip', choices=['sync', 'filter', 'throttle'], action='append', default=[])
+    parser.add_argument('--json', dest='json_path', help='write results as JSON')
+    args = parser.parse_args()
+
+    sys.path.insert(0, fakes.ROOT)
+    modes = [x for x in args.modes.split(',') if x]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='yt-audio-bench-') as directory:
+        bench = Benchmark(directory, args.latency, args.audio_format)
+        if 'sync' not in args.skip:
+            for mode in modes:
+                for size in args.playlist_sizes:
+                    result = bench.bench_sync(size, mode)
+                    results.append({'benchmark': 'sync', 'mode': mode,
+                                    'playlist_size': size, 'result': result})
+                    print('sync    {0:<8} playlist={1:<6} first={2:8.3f}s repeat={3:8.3f}s files={4} errors={5}'.format(
+                        mode, size, result['first']['seconds'], result['repeat']['seconds'],
+                        result['repeat']['files'], result['first']['errors'] + result['repeat']['errors']),
+                        flush=True)
+        if 'throttle' not in args.skip:
+            for mode in modes:
+                for size in args.playlist_sizes:
+                    result = bench.bench_throttle(size, mode)
+                    results.append({'benchmark': 'throttle', 'mode': mode,
+                                    'playlist_size': size, 'result': result})
+                    print('throttle {0:<7} playlist={1:<6} batch={2:8.3f}s stream={3:8.3f}s files={4}'.format(
+                        mode, size, result['batch']['seconds'], result['stream']['seconds'],
+                        result['stream']['files']), flush=True)
+        if 'filter' not in args.skip:
+            for mode in modes:
+                for library_size in args.library_sizes:
+                    for size in args.playlist_sizes:
+                        result = bench.bench_filter(library_size, size, mode)
+                        results.append({'benchmark': 'filter', 'mode': mode, 'library_size': library_size,
+                                        'playlist_size': size, 'result': result})
+                        print('filter  {0:<8} library={1:<6} playlist={2:<6} cold={3:8.3f}s warm={4:8.3f}s'.format(
+                            mode, library_size, size, result['cold']['seconds'],
+                            result['warm']['seconds']), flush=True)
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
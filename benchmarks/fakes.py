@@ -0,0 +1,194 @@
+"""
+Stand-in youtube-dl/ffprobe/ffmpeg executables used by benchmarks.
+
+Fake executables are small launcher scripts (written by install_fakes()) that
+call the *_main() functions below. Behaviour is controlled by environment:
+
+> FAKE_PLAYLIST_SIZE (int): no. of entries in every playlist (default: 100)
+
+> FAKE_LATENCY (float): seconds slept per info request / per downloaded title (default: 0)
+
+> FAKE_AUDIO_FORMAT (string): 'mp3' (ID3v2 tagged, read in-process by yt-audio)
+or 'raw' (only readable by fake ffprobe)
+
+> FAKE_THROTTLE (int): no. of info requests of every playlist answered with
+HTTP 429 before it is listed (default: 0). Requests are counted in FAKE_STATE
+directory (default: temp directory).
+"""
+import json
+import os
+import re
+import shlex
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parent.parent)
+BASE_URL = 'https://www.youtube.com/watch?v='
+AUDIO_SIZE = 4096
+
+LAUNCHER = '''#!{python}
+import sys
+sys.path.insert(0, {root!r})
+from benchmarks.fakes import {function}
+{function}()
+'''
+
+
+def install_fakes(bin_directory):
+    """
+    Write fake youtube-dl, ffprobe and ffmpeg executables to bin_directory
+    """
+    Path(bin_directory).mkdir(parents=True, exist_ok=True)
+    for name, function in (('youtube-dl', 'youtube_dl_main'), ('ffprobe', 'ffprobe_main'),
+                           ('ffmpeg', 'ffmpeg_main')):
+        path = Path(bin_directory, name)
+        path.write_text(LAUNCHER.format(
+            python=sys.executable, root=ROOT, function=function))
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def video_id(playlist, index):
+    return '{0}{1:06d}'.format(playlist, index)[-11:].rjust(11, '_')
+
+
+def _syncsafe(size):
+    return bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+
+
+def _id3_frame(frame_id, body):
+    return frame_id + _syncsafe(len(body)) + b'\x00\x00' + body
+
+
+def write_audio(path, url, title, audio_format='mp3', size=AUDIO_SIZE):
+    """
+    Write dummy audio file tagged with purl
+    """
+    if audio_format == 'mp3':
+        tag = (_id3_frame(b'TIT2', b'\x03' + title.encode('utf-8')) +
+               _id3_frame(b'TXXX', b'\x03purl\x00' + url.encode('utf-8')) + b'\x00' * 64)
+        data = b'ID3\x04\x00\x00' + _syncsafe(len(tag)) + tag
+    else:
+        data = 'FAKE\npurl={0}\n'.format(url).encode('utf-8')
+    with open(path, 'wb') as audio_file:
+        audio_file.write(data + b'\x00' * max(0, size - len(data)))
+
+
+def _latency():
+    latency = float(os.environ.get('FAKE_LATENCY', '0'))
+    if latency:
+        time.sleep(latency)
+
+
+def _throttled(url):
+    """
+    Answer info request with HTTP 429 (first FAKE_THROTTLE requests of URL)
+    """
+    count = int(os.environ.get('FAKE_THROTTLE', '0'))
+    if not count:
+        return False
+    path = Path(os.environ.get('FAKE_STATE') or tempfile.gettempdir(),
+                'fake-throttle-' + re.sub(r'\W', '_', url))
+    try:
+        requests = int(path.read_text())
+    except (OSError, ValueError):
+        requests = 0
+    if requests >= count:
+        return False
+    path.write_text(str(requests + 1))
+    print('ERROR: Unable to download webpage: HTTP Error 429: Too Many Requests',
+          file=sys.stderr, flush=True)
+    return True
+
+
+def _entries(url):
+    playlist = re.sub(r'\W', '', url.split('=')[-1].split('/')[-1])[:5] or 'pl'
+    size = int(os.environ.get('FAKE_PLAYLIST_SIZE', '100'))
+    return playlist, [{'_type': 'url', 'ie_key': 'Youtube', 'id': video_id(playlist, i),
+                       'url': video_id(playlist, i), 'title': 'Title {0}'.format(i)}
+                      for i in range(size)]
+
+
+def _option(args, *names):
+    for name in names:
+        if name in args and args.index(name) + 1 < len(args):
+            return args[args.index(name) + 1]
+    return None
+
+
+def youtube_dl_main():
+    args = sys.argv[1:]
+    if '--version' in args:
+        print('2021.12.17')
+        return
+    if '-a' in args or '--batch-file' in args:
+        batch = _option(args, '-a', '--batch-file')
+        source = sys.stdin if batch == '-' else open(batch)
+        args = args + [x.strip() for x in source if x.strip()]
+    if '--flat-playlist' in args:
+        _latency()
+        url = args[-1]
+        if _throttled(url):
+            sys.exit(1)
+        playlist, entries = _entries(url)
+        if '--dump-json' in args:
+            for entry in entries:
+                print(json.dumps(entry), flush=True)
+        else:
+            print(json.dumps({'_type': 'playlist', 'id': playlist,
+                              'title': 'Playlist {0}'.format(playlist), 'entries': entries}))
+        return
+
+    template = _option(args, '-o', '--output') or '%(title)s.%(ext)s'
+    archive = _option(args, '--download-archive')
+    audio_format = os.environ.get('FAKE_AUDIO_FORMAT', 'mp3')
+    for url in [x for x in args if x.startswith(BASE_URL)]:
+        _id = url[len(BASE_URL):]
+        title = 'Title {0}'.format(_id)
+        path = template.replace('%(title)s', title).replace('%(id)s', _id).replace(
+            '%(display_id)s', _id).replace('%(ext)s', 'mp3' if audio_format == 'mp3' else 'raw')
+        # Same order as youtube-dl (YoutubeDL.process_info): info is printed
+        # before the file is downloaded and post-processed
+        print(json.dumps({'id': _id, 'title': title, 'extractor': 'youtube',
+                          'webpage_url': url, '_filename': path,
+                          'filesize': AUDIO_SIZE}), flush=True)
+        _latency()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        write_audio(path, url, title, audio_format, size=AUDIO_SIZE)
+        if _option(args, '--exec'):
+            # Run after post-processing, {} is replaced with file path
+            sys.stdout.flush()
+            subprocess.call(_option(args, '--exec').replace('{}', shlex.quote(path)), shell=True)
+        if archive:
+            with open(archive, 'a') as archive_file:
+                archive_file.write('youtube {0}\n'.format(_id))
+
+
+def ffprobe_main():
+    args = sys.argv[1:]
+    if '-version' in args:
+        print('ffprobe version 4.4 (fake)')
+        return
+    tags = {}
+    try:
+        with open(args[-1], 'rb') as audio_file:
+            data = audio_file.read(4096)
+        if data.startswith(b'FAKE\n'):
+            for line in data.decode('utf-8', 'replace').splitlines():
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    tags[key] = value.rstrip('\x00')
+        elif data.startswith(b'ID3'):
+            match = re.search(rb'purl\x00([^\x00]+)', data)
+            if match:
+                tags['purl'] = match.group(1).decode('utf-8')
+    except OSError:
+        return
+    print(json.dumps({'format': {'filename': args[-1], 'tags': tags}}))
+
+
+def ffmpeg_main():
+    print('ffmpeg version 4.4 (fake)')
@@ -18,7 +18,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/pseudoroot/yt-audio",
-    packages=find_namespace_packages(),
+    packages=find_namespace_packages(include=['yt_audio*']),
     install_requires=['youtube-dl'],
     entry_points={
         'console_scripts': [
@@ -1,11 +1,33 @@
 #!/usr/bin/env python3
 
-import json
+import ast
+import math
+import os
+import queue
+import re
+import socket
 import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path, PurePath
 
+from .archive import ArchiveIndex
 from .arguments import get_args
 from .common import Common
+from .daemon import SyncDaemon
+from .dashboard import Dashboard
+from .engine import DONE_ARGS, ENGINES
+from .info_cache import PlaylistInfoCache
+from .journal import SyncJournal
+from .lease import LeaseQueue
+from .media_cache import MediaCache
+from .metrics import Metrics
+from .probe_cache import ProbeCache
+from .ratelimit import RateLimiter
+from .store import AudioStore
+from .transcode import Transcoder
 
 
 class YTAudio:
@@ -13,12 +35,36 @@ class YTAudio:
     YTAudio Class. Program execution begins here.
     """
 
-    def __init__(self):
+    # Pass URL(s) in batch file if they exceed this length on command line (URL_BATCH_FILE = auto)
+    BATCH_FILE_THRESHOLD = 8000
+
+    # Attempts of an info fetch throttled by server (with rate limiter)
+    INFO_ATTEMPTS = 3
+
+    # Worker archive file of a sync run: <archive>.worker<N>.<pid>-<random>-<host>
+    RUN_PART_PATTERN = re.compile(r'\.worker\d+\.(\d+)-([0-9a-f]+)-(.+)$')
+
+    def __init__(self, args=None, config=None, common=None):
+        """
+        Parameters:
+        ==========
+        > args (dict)(optional): Options (config keys in lowercase, 'url_list' for URL(s)).
+        CLI arguments are parsed if not given.
+
+        > config (dict)(optional): Configuration (config file is read if not given)
+
+        > common (Common)(optional): Common instance to reuse (engine, caches, indexes)
+
+        Invalid input exits program when run from CLI (args not given), otherwise
+        exception is raised.
+        """
         try:
-            self.common = Common()
-            self.config = self.common.read_config()
-            self.args, self.custom_args = get_args(self.config['DEFAULT'])
-            self.common.check_dependencies()
+            self.common = common or Common()
+            self.config = config if config is not None else self.common.read_config()
+            if args is None:
+                self.args, self.custom_args = get_args(self.config['DEFAULT'])
+            else:
+                self.args, self.custom_args = args, {}
             self.url_list = []
             self.output_format = ''
             self.playlist_info_cmd = ''
@@ -27,11 +73,42 @@ class YTAudio:
             self.use_archive = False
             self.use_metadata = False
             self.archive_file = ''
+            self.playlist_workers = 1
+            self.download_workers = 1
+            self.info_ttl = 0
+            self.info_ttl_overrides = {}
+            self.refresh = False
+            self.stream = False
+            self.stream_batch_size = 10
+            self.playlist_stream_cmd = ''
+            self.info_cache = None
+            self.current_url = ''
+            self.metrics_file = ''
+            self.metrics_format = 'json'
+            self.audio_store = None
+            self.journal = None
+            self.download_errors = {}
+            self.transcoder = None
+            self.thumbnailer = None
+            self.url_batch_file = 'auto'
+            self.download_batch_size = 1000
+            self.use_leases = False
+            self.lease_ttl = 120
+            self.lease_queue = None
+            self.lease_queues = {}
+            self.lease_owner = LeaseQueue.new_owner()
+            self.metadata_scans = {}
+            self.run_id = self.new_run_id()
+            self._lease_lock = threading.Lock()
+            self.results = None
+            self.error = None
 
             self.yt_base_url = 'https://www.youtube.com/watch?v='
             self.ytdl_required_args = ['-x', '--print-json']
             self.resolve_input()
         except Exception as ex:
+            if args is not None:
+                raise
             self.common.log(str(ex), 'error')
             exit(1)
 
@@ -47,8 +124,8 @@ class YTAudio:
                     "URL(s)/custom arguments required. Use --help for available options\n")
             self.output_format = self.common.get_value(
                 self.config['DEFAULT'], self.args, 'output_format').replace('%%', '%')
-            self.output_directory = self.common.get_value(
-                self.config['DEFAULT'], self.args, 'output_directory')
+            self.output_directory = os.path.expanduser(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'output_directory'))
             self.playlist_info_cmd = self.common.get_value(
                 self.config['DEFAULT'], self.args, 'playlist_info_command')
             self.ffprobe_cmd = self.common.get_value(
@@ -59,9 +136,124 @@ class YTAudio:
                 self.config['DEFAULT'], self.args, 'use_archive')
             self.use_metadata = self.common.get_value(
                 self.config['DEFAULT'], self.args, 'use_metadata')
+            self.playlist_workers = max(1, int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'playlist_workers')))
+            self.download_workers = max(1, int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'download_workers')))
+
+            self.info_ttl = int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'playlist_info_ttl'))
+            _overrides = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'playlist_info_ttl_overrides')
+            self.info_ttl_overrides = ast.literal_eval(_overrides) if _overrides else {}
+            self.refresh = bool(self.args.get('refresh'))
+            self.stream = bool(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'stream'))
+            self.stream_batch_size = max(1, int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'stream_batch_size')))
+            self.playlist_stream_cmd = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'playlist_stream_command')
+            self.info_cache = PlaylistInfoCache(self.common.get_cache_path())
+            self.metrics_file = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'metrics_file')
+            self.metrics_format = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'metrics_format')
+            if self.metrics_format not in Metrics.FORMATS:
+                raise Exception("Unknown metrics format '{0}'. Available formats: {1}\n".format(
+                    self.metrics_format, ', '.join(Metrics.FORMATS)))
+
+            # Optional components are reset when disabled (config reloaded by daemon)
+            _store = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'audio_store')
+            self.audio_store = None
+            if _store:
+                self.audio_store = AudioStore(os.path.expanduser(_store), self.common.get_value(
+                    self.config['DEFAULT'], self.args, 'audio_store_link'))
+
+            if self.common.get_value(self.config['DEFAULT'], self.args, 'rate_limit'):
+                _limits = {
+                    'request_rate': float(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'request_rate')),
+                    'byte_rate': self.common.parse_size(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'byte_rate')),
+                    'max_concurrency': int(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'max_concurrency')),
+                    'pause': float(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'throttle_pause'))}
+                if self.common.limiter is None:
+                    self.common.limiter = RateLimiter(**_limits)
+                else:
+                    # Limiter is shared by syncs of Common (daemon/API): keep its
+                    # adapted concurrency and throttle state
+                    self.common.limiter.configure(**_limits)
+            else:
+                self.common.limiter = None
 
-            if not self.common.ffprobe and self.common.avprobe:
-                self.ffprobe_cmd.replace('ffprobe', 'avprobe')
+            _dashboard = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'dashboard')
+            _progress_json = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'progress_json')
+            if _dashboard or _progress_json:
+                _interval = float(self.common.get_value(
+                    self.config['DEFAULT'], self.args, 'dashboard_interval'))
+                _json_path = os.path.expanduser(_progress_json) if _progress_json else None
+                if self.common.dashboard is None:
+                    self.common.dashboard = Dashboard(
+                        _interval, console=bool(_dashboard), json_path=_json_path)
+                else:
+                    # Shared by syncs of Common (daemon/API), only settings are updated
+                    self.common.dashboard.configure(
+                        _interval, console=bool(_dashboard), json_path=_json_path)
+                if '--newline' not in self.download_cmd.split(' '):
+                    # One progress line per update (parsed by dashboard)
+                    _temp = self.download_cmd.split(' ')
+                    _temp.insert(1, '--newline')
+                    self.download_cmd = ' '.join(_temp)
+            elif self.common.dashboard is not None:
+                self.common.dashboard.close()
+                self.common.dashboard = None
+
+            self.url_batch_file = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'url_batch_file')
+            if self.url_batch_file not in (True, False, 'auto'):
+                raise Exception("URL_BATCH_FILE must be 1, 0 or auto\n")
+            self.download_batch_size = max(1, int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'download_batch_size')))
+            self.use_leases = bool(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'lease_queue'))
+            self.lease_ttl = max(10, int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'lease_ttl')))
+
+            self.journal = None
+            if self.common.get_value(self.config['DEFAULT'], self.args, 'use_journal'):
+                self.journal = SyncJournal(
+                    self.common.get_cache_path(),
+                    backoff=int(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'retry_backoff')),
+                    max_backoff=int(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'retry_max_backoff')),
+                    max_attempts=max(1, int(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'retry_max_attempts'))),
+                    owner=self.lease_owner)
+                if self.args.get('retry_parked'):
+                    self.common.log('{0} parked record(s) will be retried.'.format(
+                        self.journal.unpark()), 'info')
+
+            _engine = self.common.get_value(
+                self.config['DEFAULT'], self.args, 'engine')
+            if _engine not in ENGINES:
+                raise Exception("Unknown engine '{0}'. Available engines: {1}\n".format(
+                    _engine, ', '.join(ENGINES)))
+            try:
+                if type(self.common.engine) is not ENGINES[_engine]:
+                    self.common.engine = ENGINES[_engine](self.common)
+            except ImportError as ex:
+                self.common.log(
+                    '{0}. Falling back to subprocess engine.'.format(str(ex)), 'warning')
+            self.common.engine.command_timeout = float(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'command_timeout')) or None
+            self.common.engine.idle_timeout = float(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'download_idle_timeout')) or None
 
             if self.use_metadata and self.use_archive:
                 self.use_archive = True
@@ -76,6 +268,7 @@ class YTAudio:
             if self.use_metadata and '--add-metadata' not in self.download_cmd:
                 self.ytdl_required_args.append('--add-metadata')
 
+            self.archive_file = ''
             if self.use_archive:
                 if '--download-archive' not in self.download_cmd:
                     _temp = self.download_cmd.split(' ')
@@ -93,111 +286,1072 @@ class YTAudio:
                 _message = 'The following youtube-dl arguments are mandatory: {0}\n'.format(
                     " ".join(_missed_req_args))
                 raise Exception(_message)
+
+            _media_cache = None
+            if self.common.get_value(self.config['DEFAULT'], self.args, 'media_cache'):
+                # Thumbnails/metadata are embedded from cache by transcoder
+                _media_cache = MediaCache(
+                    str(PurePath(self.common.get_cache_path(), 'media')),
+                    self.common.parse_size(self.common.get_value(
+                        self.config['DEFAULT'], self.args, 'media_cache_size')))
+
+            _transcode_workers = int(self.common.get_value(
+                self.config['DEFAULT'], self.args, 'transcode_workers'))
+            self.transcoder = None
+            self.thumbnailer = None
+            if self.common.get_value(self.config['DEFAULT'], self.args, 'pipeline'):
+                # youtube-dl only downloads audio stream; transcoding (and archive
+                # recording) is done by transcoder
+                self.transcoder = Transcoder.from_download_command(
+                    self.common, self.download_cmd, _transcode_workers, _media_cache)
+                self.download_cmd = self.transcoder.download_command(self.download_cmd)
+            elif _media_cache and '--embed-thumbnail' in self.download_cmd.split(' '):
+                # youtube-dl converts and tags titles, cached thumbnail is embedded afterwards
+                self.thumbnailer = Transcoder(
+                    self.common, embed_thumbnail=True, workers=_transcode_workers,
+                    media_cache=_media_cache)
+                self.download_cmd = ' '.join(
+                    x for x in self.download_cmd.split(' ') if x != '--embed-thumbnail')
+
+            if '--exec' in self.download_cmd.split(' '):
+                raise Exception('youtube-dl argument --exec is not supported '
+                                '(used by yt-audio to detect downloaded titles)\n')
+            _temp = self.download_cmd.split(' ')
+            _temp.insert(1, DONE_ARGS)
+            self.download_cmd = ' '.join(_temp)
         except Exception as ex:
             raise ex
 
+    def load_tracker(self, path, archive_file=''):
+        """
+        Load downloaded title(s) of path based on tracking method
+
+        Parameters:
+        ==========
+        > path (string): Save directory
+
+        > archive_file (string)(optional): Archive file name
+
+        Returns:
+        =======
+        > (function) is_downloaded(url) or None if title(s) are not tracked
+        """
+        if not Path(path).exists():
+            return None
+        if self.use_archive:
+            with self.common.metrics.phase('archive_filter', self.current_url) as _phase:
+                _index = self._load_archive(path, archive_file)
+                _phase['items'] = len(_index) if _index is not None else 0
+            if _index is not None and len(_index):
+                return _index.contains_url
+            return None
+        elif self.use_metadata:
+            _mtime = os.stat(path).st_mtime_ns
+            _files = {}
+            with self.common.metrics.phase('metadata_scan', self.current_url) as _phase:
+                _urls = self._scan_metadata(path, _phase, _files)
+            if self.use_leases:
+                # Scanned again for title(s) downloaded by other processes (see claim_urls())
+                self.metadata_scans[path] = {'urls': _urls, 'files': _files, 'mtime': _mtime}
+            return _urls.__contains__
+        return None
+
+    @staticmethod
+    def new_run_id():
+        """
+        Get unique id of a sync run (<pid>-<random>-<host>), suffix of its worker archive files
+        """
+        return '{0}-{1}-{2}'.format(os.getpid(), uuid.uuid4().hex[:8], socket.gethostname())
+
+    def _load_archive(self, path, archive_file):
+        """
+        Merge leftover worker archive files and read archive index of path
+        """
+        _archive_path = str(PurePath(path, archive_file))
+        _parts = [str(x) for x in Path(_archive_path).parent.glob(
+            Path(_archive_path).name + '.worker*')]
+        # Worker archive files of running syncs are still being written
+        _parts = [x for x in _parts if self._is_abandoned(x)]
+        if _parts:
+            self.common.merge_archive(_archive_path, _parts)
+        return self.common.read_archive(_archive_path)
+
+    def _is_abandoned(self, path):
+        """
+        Check if worker archive file was left by a sync that is not running:
+        its process exited (same host), or file was not modified within lease TTL
+        """
+        _match = self.RUN_PART_PATTERN.search(path)
+        if _match and _match.group(3) == socket.gethostname() and os.name == 'posix':
+            try:
+                os.kill(int(_match.group(1)), 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass
+            return False
+        try:
+            return time.time() - os.path.getmtime(path) > self.lease_ttl
+        except OSError:
+            return False
+
+    def _scan_metadata(self, path, phase, files=None):
+        """
+        Read URL(s) of files in path (using probe cache). Size and mtime of
+        scanned files are added to files (dict) if given.
+        """
+        _cache = ProbeCache(path)
+        _urls = set()
+        _pending = {}
+        for title in Path(path).iterdir():
+            if title.name.startswith((ProbeCache.FILE_NAME, LeaseQueue.FILE_NAME)) or \
+                    not title.is_file():
+                continue
+            _stat = title.stat()
+            if files is not None:
+                files[title.name] = (_stat.st_size, _stat.st_mtime_ns)
+            _hit, _url = _cache.get(title.name, _stat)
+            if not _hit:
+                _pending[str(PurePath(path, title.name))] = (title.name, _stat)
+            elif _url:
+                _urls.add(_url)
+            phase['items'] = phase.get('items', 0) + 1
+        if _pending:
+            _file_urls = self.common.get_file_urls(
+                list(_pending), self.ffprobe_cmd)
+            for audio_path, (name, _stat) in _pending.items():
+                _url = _file_urls.get(audio_path)
+                _cache.set(name, _stat, _url)
+                if _url:
+                    _urls.add(_url)
+        _cache.save()
+        phase['probes'] = len(_pending)
+        if _pending:
+            self.common.log(
+                "Read metadata of {0} new/changed file(s).".format(len(_pending)))
+        return _urls
+
+    def rescan_metadata(self, path):
+        """
+        Read URL(s) of files added/changed in path since it was scanned (only
+        if directory was modified since). Files scanned before are not read again.
+
+        Returns:
+        =======
+        > (set) URL(s) of files in path
+        """
+        _scan = self.metadata_scans.setdefault(
+            path, {'urls': set(), 'files': {}, 'mtime': None})
+        try:
+            _mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return _scan['urls']
+        if _mtime == _scan['mtime']:
+            return _scan['urls']
+        _scan['mtime'] = _mtime
+        _pending = {}
+        for title in Path(path).iterdir():
+            if title.name.startswith((ProbeCache.FILE_NAME, LeaseQueue.FILE_NAME)) or \
+                    not title.is_file():
+                continue
+            _stat = title.stat()
+            _key = (_stat.st_size, _stat.st_mtime_ns)
+            if _scan['files'].get(title.name) != _key:
+                _scan['files'][title.name] = _key
+                _pending[str(PurePath(path, title.name))] = title.name
+        if _pending:
+            _file_urls = self.common.get_file_urls(list(_pending), self.ffprobe_cmd)
+            _scan['urls'].update(x for x in _file_urls.values() if x)
+        return _scan['urls']
+
     def filter_download_urls(self, path, url_list, archive_file=''):
         """
         Filter URL(s) to download based on tracking method
         """
-        urls_to_download = []
-        if Path(path).exists():
-            if self.use_archive:
-                _archive_path = str(PurePath(path, archive_file))
-                _archive_file_content = self.common.read_archive(_archive_path)
-                if _archive_file_content:
-                    _archive_file_content = [
-                        (self.yt_base_url+x.split(' ')[1]).replace('\n', '') for x in _archive_file_content]
-                    urls_to_download = [
-                        x for x in url_list if x not in _archive_file_content]
-                    return urls_to_download
+        _is_downloaded = self.load_tracker(path, archive_file)
+        if _is_downloaded is None:
+            return url_list
+        return [x for x in url_list if not _is_downloaded(x)]
+
+    def place_stored(self, urls):
+        """
+        Place title(s) found in audio store into output directory (instead of
+        downloading them again) and record them in archive
+
+        Parameters:
+        ==========
+        > urls (list): URL(s) to download
+
+        Returns:
+        =======
+        > (tuple) URL(s) not in audio store (list), no. of titles placed
+        """
+        if not self.audio_store:
+            return urls, 0
+        _remaining, _placed = [], []
+        with self.common.metrics.phase('store', self.current_url) as _phase:
+            for url in urls:
+                _key = self._place_stored(url)
+                if _key:
+                    _placed.append(_key)
                 else:
-                    return url_list
-            elif self.use_metadata:
-                for title in Path(path).iterdir():
-                    audio_path = str(PurePath(path, title.name))
-                    _url = self.common.get_file_url(
-                        audio_path, self.ffprobe_cmd)
-                    if _url and _url in url_list:
-                        url_list.remove(_url)
-                return url_list
+                    _remaining.append(url)
+            _phase['items'] = len(_placed)
+        self._record_placed(_placed)
+        return _remaining, len(_placed)
+
+    def _place_stored(self, url):
+        """
+        Place stored title into output directory. Returns store key or None (not stored)
+        """
+        _key = ArchiveIndex.url_key(url)
+        if _key is None:
+            return None
+        try:
+            if self.audio_store.place(_key, self.output_directory):
+                self.track([url], 'placed')
+                return _key
+        except OSError as ex:
+            self.common.log('Unable to place {0} from audio store: {1}'.format(
+                _key[1], str(ex)), 'warning')
+        return None
+
+    def _record_placed(self, keys):
+        """
+        Log placed title(s) and record them in archive
+        """
+        if not keys:
+            return
+        self.common.log("{0} record(s) placed from audio store.".format(len(keys)))
+        if self.use_archive:
+            self.common.append_archive(str(Path(self.output_directory, self.archive_file)),
+                                       ['{0} {1}'.format(*x) for x in keys])
+
+    def new_progress(self, title_count=0):
+        """
+        Create download progress reporting downloaded title(s) to journal/audio
+        store (after transcoding in pipeline mode, after embedding cached thumbnail
+        with media cache)
+        """
+        progress = self.common.new_progress(title_count, on_error=self.on_download_error)
+        _url = self.current_url
+        if self.thumbnailer:
+            progress['jobs'] = []
+            progress['on_download'] = lambda info: progress['jobs'].append(
+                self.thumbnailer.submit_thumbnail(info, progress, self.on_download, _url))
+            return progress
+        if not self.transcoder:
+            progress['on_download'] = self.on_download
+            return progress
+
+        _directory = self.output_directory
+
+        def _transcoded(info):
+            if self.use_archive and info.get('id'):
+                _extractor = info.get('extractor_key') or info.get('extractor') or 'youtube'
+                self.common.append_archive(str(Path(_directory, self.archive_file)),
+                                           ['{0} {1}'.format(_extractor.lower(), info['id'])])
+            self.on_download(info)
+
+        progress['jobs'] = []
+        progress['on_download'] = lambda info: progress['jobs'].append(
+            self.transcoder.submit(info, _directory, progress, _transcoded, _url))
+        return progress
+
+    def on_download(self, info):
+        """
+        Record downloaded title in journal and add it to audio store (called
+        for every title once it is downloaded and post-processed, info
+        has its file path)
+        """
+        if not info.get('id'):
+            return
+        if self.journal:
+            self.journal.mark(self.current_url, [(info['id'], None)], 'done')
+        _path = AudioStore.find_download(info) if self.audio_store or self.results is not None else None
+        if self.audio_store and _path:
+            _extractor = info.get('extractor_key') or info.get('extractor') or 'youtube'
+            self.audio_store.add((_extractor.lower(), info['id']), _path)
+        if self.results is not None:
+            self.results.setdefault(info['id'], {'id': info['id'], 'url': info.get('webpage_url')})
+            self.results[info['id']].update(
+                {'status': 'downloaded', 'title': info.get('title'), 'path': _path})
+
+    def on_download_error(self, message):
+        """
+        Remember youtube-dl error of title (used as failure reason in journal)
+        """
+        _match = Common.ERROR_ID_PATTERN.search(message)
+        if _match:
+            self.download_errors[_match.group(1)] = message
+
+    def track(self, urls, status, **fields):
+        """
+        Record status of title(s) in sync results (only if results are collected,
+        see api.Syncer)
+
+        Parameters:
+        ==========
+        > urls (list): URL(s)
+
+        > status (string): 'pending'/'downloaded'/'placed'/'skipped'/'deferred'/'failed'
+
+        > fields: Additional fields (title, path, reason)
+        """
+        if self.results is None:
+            return
+        for video_id, url in self.url_titles(urls):
+            _result = self.results.setdefault(video_id, {'id': video_id, 'url': url})
+            _result['status'] = status
+            _result.update(fields)
+
+    def track_failed(self, urls):
+        """
+        Record title(s) still pending after download as failed in sync results
+        """
+        if self.results is None:
+            return
+        for video_id, _ in self.url_titles(urls):
+            _result = self.results.get(video_id)
+            if _result and _result['status'] == 'pending':
+                _result.update({'status': 'failed', 'reason': self.download_errors.get(
+                    video_id, 'Download failed')})
+
+    @staticmethod
+    def url_titles(urls):
+        """
+        Get (video id, URL) tuple(s) of URL(s) that can be tracked in journal/lease queue
+        """
+        _titles = []
+        for url in urls:
+            _key = ArchiveIndex.url_key(url)
+            if _key:
+                _titles.append((_key[1], url))
+        return _titles
+
+    def journal_begin(self, urls):
+        """
+        Filter out title(s) waiting for retry/parked and record remaining
+        title(s) as pending in journal
+
+        Parameters:
+        ==========
+        > urls (list): URL(s) to download
+
+        Returns:
+        =======
+        > (list) URL(s) to download now
+        """
+        self.download_errors = {}
+        if not self.journal:
+            return urls
+        _titles = self.url_titles(urls)
+        _due, _waiting, _parked = self.journal.due(self.current_url, _titles)
+        if _waiting or _parked:
+            self.common.log("{0} failed record(s) waiting for retry, {1} record(s) parked "
+                            "(use --retry-parked to retry).".format(_waiting, _parked), 'warning')
+        _skipped = set(x[1] for x in _titles) - set(x[1] for x in _due)
+        self.track(list(_skipped), 'deferred')
+        self.journal.mark(self.current_url, _due, 'pending', self.output_directory)
+        return [x for x in urls if x not in _skipped]
+
+    def journal_mark(self, urls, state):
+        """
+        Record state of URL(s) in journal
+        """
+        if self.journal:
+            self.journal.mark(self.current_url, self.url_titles(
+                urls), state, self.output_directory)
+
+    def get_lease_queue(self, directory):
+        """
+        Get (shared) lease queue of output directory
+        """
+        with self._lease_lock:
+            if directory not in self.lease_queues:
+                self.lease_queues[directory] = LeaseQueue(
+                    directory, self.lease_ttl, self.lease_owner)
+            return self.lease_queues[directory]
+
+    def claim_urls(self, urls):
+        """
+        Claim leases of URL(s). URL(s) leased by another process are skipped, as well
+        as URL(s) finished by another process since filtering (lines appended to
+        archive/files added to save directory are read: leases of finished titles
+        are released).
+
+        Parameters:
+        ==========
+        > urls (list): URL(s) to download
+
+        Returns:
+        =======
+        > (list) URL(s) to download
+        """
+        if not self.lease_queue:
+            return urls
+        _titles = self.url_titles(urls)
+        _claimed = self.lease_queue.claim(self.current_url, [x[0] for x in _titles])
+        _skipped = set(x[1] for x in _titles if x[0] not in _claimed)
+        if _skipped:
+            self.common.log("{0} record(s) are being downloaded by another process.".format(
+                len(_skipped)))
+            self.track(list(_skipped), 'skipped', reason='Downloaded by another process')
+        urls = [x for x in urls if x not in _skipped]
+        if (self.use_archive or self.use_metadata) and urls:
+            if self.use_archive:
+                _pending = self.filter_download_urls(self.output_directory, urls, self.archive_file)
             else:
-                return url_list
-        else:
-            return url_list
+                _downloaded = self.rescan_metadata(self.output_directory)
+                _pending = [x for x in urls if x not in _downloaded]
+            _finished = [x for x in urls if x not in _pending]
+            self.track(_finished, 'skipped', reason='Downloaded by another process')
+            self.release_urls(_finished)
+            urls = _pending
+        return urls
 
-    def yt_audio(self):
+    def release_urls(self, urls):
         """
-        Main method. This method controls the entire program's logic.
+        Release leases of URL(s)
+        """
+        if self.lease_queue and urls:
+            self.lease_queue.release(self.current_url, [x[0] for x in self.url_titles(urls)])
+
+    def journal_end(self, urls):
+        """
+        Record title(s) that were not downloaded as failed (retried with backoff)
+        """
+        if not self.journal:
+            return
+        for video_id, _ in self.url_titles(urls):
+            record = self.journal.get(self.current_url, video_id)
+            if not record or record['state'] not in SyncJournal.UNFINISHED:
+                continue
+            record = self.journal.fail(self.current_url, video_id, self.download_errors.get(
+                video_id, 'Download failed'))
+            if record['state'] == 'parked':
+                self.common.log("Parked {0} after {1} failed attempt(s): {2}".format(
+                    video_id, record['attempts'], record['reason']), 'warning')
+
+    def resolve_url(self, url):
+        """
+        Split URL[::DIR] input into URL and save directory
+
+        Parameters:
+        ==========
+        > url (string): URL with (optional) save directory
+
+        Returns:
+        =======
+        > (tuple) URL, save directory
+        """
+        url = url.replace('\\', '')
+        _output_directory = self.output_directory
+        if len(url.split("::")) > 1:
+            _output_directory = os.path.expanduser(url.split("::")[1])
+            url = url.split("::")[0]
+        return url, _output_directory
+
+    def fetch_info(self, url):
+        """
+        Fetch URL info (playlist/title) using playlist_info_command.
+        Info is served from cache if it is younger than URL's TTL (unless --refresh).
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        Returns:
+        =======
+        > (tuple) URL info (dict) or None, error message (string) or None
         """
         try:
-            _audio_directory = self.output_directory
-            for url in self.url_list:
-                _remote_url_list = []
-                url = url.replace('\\', '')
-                self.output_directory = _audio_directory
-                if len(url.split("::")) > 1:
-                    self.output_directory = url.split("::")[1]
-                    url = url.split("::")[0]
-                command = self.playlist_info_cmd.replace("$PLAYLIST_URL$", url)
-                print()
-                self.common.log(
-                    "Fetching info for URL '{0}'".format(url), 'info')
-                out = next(self.common.ExecuteCommand(command))
+            _ttl = int(self.info_ttl_overrides.get(url, self.info_ttl))
+            if self.info_cache and not self.refresh:
+                _info = self.info_cache.get(url, _ttl)
+                if _info is not None:
+                    self.common.metrics.add('info_cached', url, runs=1,
+                                            items=len(_info.get('entries') or [None]))
+                    return _info, None
+            command = self.playlist_info_cmd.replace("$PLAYLIST_URL$", url)
+            with self.common.metrics.phase('info', url) as _phase:
+                _info = self.fetch_info_limited(command)
+                _phase['items'] = len(_info.get('entries') or [None])
+            if self.info_cache:
+                self.info_cache.put(url, _info)
+            return _info, None
+        except (StopIteration, ValueError):
+            return None, "{0} is not a valid url. Please check and try again.".format(url)
+        except Exception as ex:
+            return None, "{0}: {1}".format(url, str(ex))
+
+    def fetch_info_limited(self, command, fetch=None):
+        """
+        Fetch URL info through rate limiter (if enabled). Throttling (HTTP 429)
+        reported in error is passed on to rate limiter and fetch is retried
+        once rate limiter lets new requests through again (up to INFO_ATTEMPTS
+        attempts).
+
+        Parameters:
+        ==========
+        > command (string): playlist info command (URL substituted)
+
+        > fetch (function)(optional): fetch(command) returning URL info (default: engine.fetch_info)
+
+        Returns:
+        =======
+        > (dict) URL info
+        """
+        fetch = fetch or self.common.engine.fetch_info
+        _limiter = self.common.limiter
+        if not _limiter:
+            return fetch(command)
+        for _attempt in range(self.INFO_ATTEMPTS):
+            with _limiter.slot():
                 try:
-                    out = json.loads(out)
-                except json.JSONDecodeError:
-                    self.common.log(
-                        "{0} is not a valid url. Please check and try again.".format(url), 'error')
+                    _info = fetch(command)
+                except Exception as ex:
+                    # Subprocess engine: youtube-dl error is in JSON decode error's document
+                    if not _limiter.is_throttled(getattr(ex, 'doc', None) or str(ex)):
+                        raise
+                    self.common.report_throttle()
                     continue
+            _limiter.success()
+            return _info
+        raise RuntimeError('Throttled by server (HTTP 429), gave up after {0} attempt(s)'.format(
+            self.INFO_ATTEMPTS))
 
-                url_title = out["title"]
-                # Check if URL is playlist
-                if 'entries' in out:
-                    playlist_entries_count = len(out["entries"])
-                    _remote_url_list = [self.yt_base_url+x["id"]
-                                        for x in out["entries"]]
-                    self.output_directory = str(
-                        PurePath(self.output_directory, url_title))
-                    self.common.log("Found {0} record(s) in [Remote] playlist '{1}'".format(
-                        playlist_entries_count, url_title))
-                    self.common.log('Save directory: {0}\n'.format(
-                        self.output_directory))
-                else:
-                    # URL is single record
-                    _remote_url_list.append(url)
-                    self.common.log('{0} (Save Directory: {1})\n'.format(
-                        url_title, self.output_directory))
-
-                urls_to_download = self.filter_download_urls(
-                    self.output_directory, _remote_url_list, self.archive_file)
-
-                if len(urls_to_download) > 0:
-                    self.common.log("{0} record(s) will be downloaded.".format(
-                        len(urls_to_download)))
-                    _download_path = str(
-                        PurePath(self.output_directory, self.output_format))
-                    _download_command = self.download_cmd.replace(
-                        "$OUTPUT$", _download_path).replace("$URL$", " ".join(urls_to_download))
-                    if self.use_archive:
-                        _archive_path = str(
-                            Path(self.output_directory, self.archive_file))
-                        _download_command = _download_command.replace(
-                            self.archive_file, _archive_path)
-                    self.common.download_audio(
-                        _download_command, len(urls_to_download))
+    def log_playlist_diff(self, url, info):
+        """
+        Log title(s) added/removed from playlist since last sync
+        """
+        if not self.info_cache:
+            return
+        _diff = self.info_cache.diff(url, info)
+        if not _diff or not (_diff[0] or _diff[1]):
+            return
+        added, removed = _diff
+        self.common.log("{0} record(s) added, {1} record(s) removed since last sync".format(
+            len(added), len(removed)), 'info')
+        for entry in added:
+            self.common.log("  + {0}".format(entry.get('title') or entry['id']))
+        for entry_id in removed:
+            self.common.log("  - {0}".format(entry_id))
+
+    def fetch_all_info(self, urls):
+        """
+        Fetch info for all URL(s) concurrently using a bounded worker pool.
+        Results are returned in the same order as input URL(s).
+
+        Parameters:
+        ==========
+        > urls (list): Video/Playlist URL(s)
+
+        Returns:
+        =======
+        > (list) (info, error) tuple for each URL
+        """
+        if len(urls) <= 1 or self.playlist_workers <= 1:
+            return [self.fetch_info(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=min(self.playlist_workers, len(urls))) as executor:
+            return list(executor.map(self.fetch_info, urls))
+
+    def build_download_commands(self, urls_to_download, worker_id=None):
+        """
+        Build youtube-dl download command(s) for URL(s). URL(s) are split across
+        download workers; with archive enabled, each worker records into its own
+        archive file which is merged into main archive after download. Long URL
+        lists are passed in a batch file (-a) instead of command line.
+
+        Parameters:
+        ==========
+        > urls_to_download (list): URL(s) to download
+
+        > worker_id (int)(optional): Build a single command for given worker
+
+        Returns:
+        =======
+        > (tuple) download command(s) (list), worker archive file(s) (list),
+        URL batch file(s) (list, to be removed after download)
+        """
+        self.common.require('ffmpeg')
+        _download_path = str(
+            PurePath(self.output_directory, self.output_format))
+        if self.transcoder:
+            _download_path = str(PurePath(Transcoder.staging_path(
+                self.output_directory), self.output_format))
+        _archive_path = str(Path(self.output_directory, self.archive_file))
+        _workers = min(self.download_workers, len(urls_to_download))
+        _worker_ids = range(_workers)
+        if worker_id is not None:
+            _workers, _worker_ids = 1, [worker_id]
+        _commands = []
+        _archive_parts = []
+        _batch_files = []
+        for i, _worker_id in enumerate(_worker_ids):
+            _urls = urls_to_download[i::_workers]
+            _url_arg = " ".join(_urls)
+            if self.url_batch_file is True or (
+                    self.url_batch_file == 'auto' and len(_url_arg) > self.BATCH_FILE_THRESHOLD):
+                _batch_file = self.common.write_batch_file(_urls)
+                _batch_files.append(_batch_file)
+                _url_arg = '-a "{0}"'.format(_batch_file)
+            _download_command = self.download_cmd.replace(
+                "$OUTPUT$", _download_path).replace("$URL$", _url_arg)
+            if self.use_archive:
+                if self.lease_queue or _workers > 1 or worker_id is not None:
+                    # Part file unique to this sync run, merged into archive under file lock
+                    _part = '{0}.worker{1}.{2}'.format(_archive_path, _worker_id, self.run_id)
+                    _archive_parts.append(_part)
+                    _download_command = _download_command.replace(
+                        self.archive_file, '"{0}"'.format(_part))
                 else:
-                    self.common.log("Title(s) are already in sync.\n")
-        except StopIteration:
-            pass
+                    _download_command = _download_command.replace(
+                        self.archive_file, '"{0}"'.format(_archive_path))
+            _commands.append(_download_command)
+        return _commands, _archive_parts, _batch_files
+
+    def sync_url(self, url, out):
+        """
+        Download pending title(s) of URL using fetched URL info
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        > out (dict): URL info
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
+        """
+        _remote_url_list = []
+        url_title = out["title"]
+        # Check if URL is playlist
+        if 'entries' in out:
+            playlist_entries_count = len(out["entries"])
+            _remote_url_list = [self.yt_base_url+x["id"]
+                                for x in out["entries"]]
+            self.output_directory = str(
+                PurePath(self.output_directory, url_title))
+            self.common.log("Found {0} record(s) in [Remote] playlist '{1}'".format(
+                playlist_entries_count, url_title))
+            self.log_playlist_diff(url, out)
+            self.common.log('Save directory: {0}\n'.format(
+                self.output_directory))
+        else:
+            # URL is single record
+            _remote_url_list.append(url)
+            self.common.log('{0} (Save Directory: {1})\n'.format(
+                url_title, self.output_directory))
+
+        urls_to_download = self.filter_download_urls(
+            self.output_directory, _remote_url_list, self.archive_file)
+        if self.results is not None:
+            _pending = set(urls_to_download)
+            self.track([x for x in _remote_url_list if x not in _pending], 'skipped')
+        return self.download_urls(url, urls_to_download)
+
+    def download_urls(self, url, urls_to_download):
+        """
+        Download title(s) into output directory (title(s) in audio store are placed instead)
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        > urls_to_download (list): URL(s) of pending title(s)
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
+        """
+        urls_to_download, _placed = self.place_stored(urls_to_download)
+        urls_to_download = self.journal_begin(urls_to_download)
+
+        if len(urls_to_download) > 0:
+            self.common.log("{0} record(s) will be downloaded.".format(
+                len(urls_to_download)))
+            progress = self.new_progress(len(urls_to_download))
+            self.track(urls_to_download, 'pending')
+            try:
+                with self.common.metrics.phase('download', url) as _phase:
+                    if self.common.limiter or self.lease_queue:
+                        _result = self.download_batches(urls_to_download, progress)
+                    elif len(urls_to_download) > self.download_batch_size * self.download_workers:
+                        # Very large download set: split into size-limited youtube-dl processes
+                        _result = self.download_batches(
+                            urls_to_download, progress, self.download_batch_size)
+                    else:
+                        _result = self.download_commands(urls_to_download, progress)
+                    _phase.update(items=_result[0], failed=_result[1],
+                                  bytes=progress['bytes'])
+            finally:
+                # Worker archive files are merged by now (see download_commands()/
+                # start_download_workers())
+                self.release_urls(urls_to_download)
+            self.journal_end(urls_to_download)
+            self.track_failed(urls_to_download)
+            return _result[0] + _placed, _result[1]
+        elif _placed:
+            return _placed, 0
+        else:
+            self.common.log("Title(s) are already in sync.\n")
+            return 0, 0
+
+    def download_commands(self, urls, progress):
+        """
+        Download URL(s) split across DOWNLOAD_WORKERS youtube-dl process(es)
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
+        """
+        _commands, _archive_parts, _batch_files = self.build_download_commands(urls)
+        self.journal_mark(urls, 'downloading')
+        try:
+            return self.common.download_audio(_commands, len(urls), progress)
+        finally:
+            self.common.remove_files(_batch_files)
+            if _archive_parts:
+                self.common.merge_archive(str(
+                    Path(self.output_directory, self.archive_file)), _archive_parts)
+            if self.transcoder:
+                Transcoder.remove_staging(self.output_directory)
+
+    def download_batches(self, urls, progress, batch_size=None):
+        """
+        Download URL(s) in batches of STREAM_BATCH_SIZE (or batch_size) title(s),
+        one youtube-dl process per batch, so rate limiter can adapt concurrency
+        between batches (and leases are claimed per batch). Batches are made
+        smaller for few URL(s), so every download worker gets a batch.
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
+        """
+        _queue = queue.Queue()
+        for _url in urls:
+            _queue.put(_url)
+        batch_size = min(batch_size or self.stream_batch_size,
+                         max(1, math.ceil(len(urls) / self.download_workers)))
+        self.common.log("Download begin\n")
+        _stop_workers = self.start_download_workers(_queue, progress, batch_size)
+        _stop_workers()
+        self.common.log("\nDownload complete!\n")
+        return self.common.download_summary(progress)
+
+    def resume_sync(self, url, records):
+        """
+        Resume interrupted sync of URL: download title(s) left unfinished in
+        journal (by a sync that is no longer running), without fetching URL info
+        again. Title(s) are filtered like new title(s) (archive/metadata, leases).
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        > records (list): Unfinished journal records of URL
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
+        """
+        _directories = {}
+        for record in records:
+            _directories.setdefault(record['directory'], []).append(record['url'])
+        _downloaded, _failed = 0, 0
+        for directory, urls in _directories.items():
+            self.output_directory = directory
+            self.common.log("Resuming interrupted sync: {0} record(s) left.".format(
+                len(urls)), 'info')
+            self.common.log('Save directory: {0}\n'.format(directory))
+            if self.use_archive or self.use_metadata:
+                # Title(s) downloaded just before interruption are tracked already
+                _pending = self.filter_download_urls(directory, urls, self.archive_file)
+                self.journal_mark([x for x in urls if x not in _pending], 'done')
+                self.track([x for x in urls if x not in _pending], 'skipped')
+                urls = _pending
+            _result = self.download_urls(url, urls)
+            _downloaded = _downloaded + _result[0]
+            _failed = _failed + _result[1]
+        return _downloaded, _failed
+
+    def start_download_workers(self, url_queue, progress, batch_size=None):
+        """
+        Start download workers downloading URL(s) from queue in batches of
+        STREAM_BATCH_SIZE title(s) (see Common.download_stream())
+
+        Parameters:
+        ==========
+        > url_queue (queue.Queue): URL(s) to download
+
+        > progress (dict): download progress
+
+        > batch_size (int)(optional): max. no. of URL(s) per youtube-dl process
+        (default: STREAM_BATCH_SIZE)
+
+        Returns:
+        =======
+        > (function) stop(): stops workers once queue is empty, waits for them
+        (and post-download jobs), merges worker archive files and releases leases
+        """
+        _workers = self.download_workers
+        _directory = self.output_directory
+        _archive_parts = set()
+        _batch_files = []
+        _claimed = []
+
+        def _build_command(urls, worker_id):
+            if self.lease_queue:
+                _urls = self.claim_urls(urls)
+                _claimed.extend(_urls)
+                if len(_urls) < len(urls):
+                    # Title(s) handled by another process: neither downloaded nor failed here
+                    self.journal_mark([x for x in urls if x not in _urls], 'done')
+                    with progress['lock']:
+                        progress['total'] = progress['total'] - (len(urls) - len(_urls))
+                if not _urls:
+                    return None
+                urls = _urls
+            self.journal_mark(urls, 'downloading')
+            _commands, _parts, _files = self.build_download_commands(
+                urls, worker_id if _workers > 1 else None)
+            _archive_parts.update(_parts)
+            _batch_files.extend(_files)
+            return _commands[0]
+
+        _threads = self.common.download_stream(
+            url_queue, _build_command, _workers, batch_size or self.stream_batch_size, progress)
+
+        def _stop():
+            for _ in _threads:
+                url_queue.put(None)
+            for _thread in _threads:
+                _thread.join()
+            self.common.wait_jobs(progress)
+            self.common.remove_files(_batch_files)
+            if self.transcoder:
+                Transcoder.remove_staging(_directory)
+            if _archive_parts:
+                self.common.merge_archive(str(Path(_directory, self.archive_file)),
+                                          sorted(_archive_parts))
+            # Leases are released once downloaded title(s) are in archive (other
+            # processes would claim them again otherwise)
+            self.release_urls(_claimed)
+        return _stop
+
+    def sync_url_stream(self, url):
+        """
+        Download pending title(s) of URL while playlist entries are being listed.
+        Entries are read one at a time, filtered against tracked title(s) and
+        queued for download workers as they arrive.
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
+        """
+        # Info command is only run for playlist title (if entries don't have it),
+        # listing first entry only
+        _title_cmd = self.playlist_info_cmd.replace("$PLAYLIST_URL$", url).split(' ')
+        _title_cmd.insert(1, '--playlist-end 1')
+        # Rate limiter slot is held until first entry is listed
+        out = self.fetch_info_limited(
+            self.playlist_stream_cmd.replace("$PLAYLIST_URL$", url),
+            lambda command: self.common.engine.stream_info(command, ' '.join(_title_cmd)))
+        if 'entries' not in out:
+            return self.sync_url(url, out)
+
+        self.output_directory = str(
+            PurePath(self.output_directory, out["title"]))
+        self.common.log("Streaming [Remote] playlist '{0}'".format(out["title"]))
+        self.common.log('Save directory: {0}\n'.format(self.output_directory))
+        _is_downloaded = self.load_tracker(
+            self.output_directory, self.archive_file)
+
+        _queue = queue.Queue()
+        progress = self.new_progress()
+        self.download_errors = {}
+        _entries = []
+        _placed = []
+        _queued = []
+        _deferred = 0
+        self.common.log("Download begin\n")
+        _start = time.perf_counter()
+        _stop_workers = self.start_download_workers(_queue, progress)
+        try:
+            for entry in out['entries']:
+                if not entry.get('id'):
+                    continue
+                _entries.append({'id': entry['id'], 'title': entry.get('title')})
+                _url = self.yt_base_url + entry['id']
+                if _is_downloaded is not None and _is_downloaded(_url):
+                    self.track([_url], 'skipped')
+                    continue
+                if self.audio_store:
+                    _key = self._place_stored(_url)
+                    if _key:
+                        _placed.append(_key)
+                        continue
+                if self.journal:
+                    _due, _waiting, _parked = self.journal.due(
+                        url, self.url_titles([_url]))
+                    if _waiting or _parked:
+                        _deferred = _deferred + 1
+                        self.track([_url], 'deferred')
+                        continue
+                _queued.append(_url)
+                self.track([_url], 'pending')
+                with progress['lock']:
+                    progress['total'] = progress['total'] + 1
+                _queue.put(_url)
+        finally:
+            _stop_workers()
+        self.common.log("\nDownload complete!\n")
+        self.journal_end(_queued)
+        self.track_failed(_queued)
+        self._record_placed(_placed)
+        if _deferred:
+            self.common.log("{0} failed/parked record(s) skipped (use --retry-parked to retry parked "
+                            "record(s)).".format(_deferred), 'warning')
+
+        _info = {'title': out['title'], 'entries': _entries}
+        self.common.log("Found {0} record(s) in [Remote] playlist '{1}'".format(
+            len(_entries), out['title']))
+        if self.info_cache:
+            self.info_cache.put(url, _info)
+        self.log_playlist_diff(url, _info)
+        if not progress['total'] and not _placed:
+            self.common.log("Title(s) are already in sync.\n")
+        _result = self.common.download_summary(progress)
+        _result = _result[0] + len(_placed), _result[1]
+        self.common.metrics.add('stream', url, seconds=time.perf_counter() - _start, runs=1,
+                                items=_result[0], failed=_result[1], bytes=progress['bytes'])
+        return _result
+
+    def run_sync(self, url, directory, out=None, error=None):
+        """
+        Sync single URL. URL info is fetched if not provided.
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        > directory (string): Save directory
+
+        > out (dict)(optional): URL info
+
+        > error (string)(optional): Error message of URL info fetch
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed or None (sync failed)
+        """
+        self.output_directory = directory
+        self.current_url = url
+        self.run_id = self.new_run_id()
+        self.lease_queue = self.get_lease_queue(directory) if self.use_leases else None
+        self.error = None
+        self.common.log('')
+        _unfinished = self.journal.unfinished(url) if self.journal else []
+        if _unfinished:
+            return self.resume_sync(url, _unfinished)
+        self.common.log(
+            "Fetching info for URL '{0}'".format(url), 'info')
+        if not self.stream and out is None and error is None:
+            out, error = self.fetch_info(url)
+        if error:
+            self.error = error
+            self.common.log(error, 'error')
+            return None
+        try:
+            if self.stream:
+                return self.sync_url_stream(url)
+            return self.sync_url(url, out)
+        except (StopIteration, ValueError):
+            self.error = "{0} is not a valid url. Please check and try again.".format(url)
+            self.common.log(self.error, 'error')
+            return None
+        except RuntimeError as ex:
+            # Stream mode: playlist listing throttled
+            self.error = "{0}: {1}".format(url, str(ex))
+            self.common.log(self.error, 'error')
+            return None
+
+    def prefetch_info(self, resolved_urls):
+        """
+        Fetch info of URL(s) in parallel before syncing them (URL(s) with
+        interrupted sync are resumed without fetching info; nothing is fetched
+        in stream mode)
+
+        Parameters:
+        ==========
+        > resolved_urls (list): (URL, save directory) tuple(s)
+
+        Returns:
+        =======
+        > (list) (info, error) tuple of each URL ((None, None) if not fetched)
+        """
+        if self.stream:
+            return [(None, None)] * len(resolved_urls)
+        if len(resolved_urls) > 1:
+            self.common.log("Fetching info for {0} URL(s)".format(
+                len(resolved_urls)), 'info')
+        _fetch = [x[0] for x in resolved_urls
+                  if not (self.journal and self.journal.unfinished(x[0]))]
+        _fetched = dict(zip(_fetch, self.fetch_all_info(_fetch)))
+        return [_fetched.get(x[0], (None, None)) for x in resolved_urls]
+
+    def yt_audio(self):
+        """
+        Main method. This method controls the entire program's logic.
+        """
+        _start = time.perf_counter()
+        try:
+            _resolved_urls = [self.resolve_url(url) for url in self.url_list]
+            _infos = self.prefetch_info(_resolved_urls)
+            _downloaded, _failed = 0, 0
+
+            for (url, _directory), (out, error) in zip(_resolved_urls, _infos):
+                _result = self.run_sync(url, _directory, out, error)
+                if _result:
+                    _downloaded = _downloaded + _result[0]
+                    _failed = _failed + _result[1]
+            if self.info_cache:
+                self.info_cache.save()
+            if _downloaded or _failed:
+                self.common.log("Summary: {0} record(s) downloaded, {1} record(s) failed.".format(
+                    _downloaded, _failed), 'warning' if _failed else 'info')
         except Exception as ex:
             self.common.log(str(ex), 'error')
+        finally:
+            self.common.metrics.add(
+                'total', seconds=time.perf_counter() - _start, runs=1)
+            self.write_metrics()
+
+    def write_metrics(self):
+        """
+        Write metrics file (if configured)
+        """
+        if not self.metrics_file:
+            return
+        try:
+            self.common.metrics.write(self.metrics_file, self.metrics_format)
+        except OSError as ex:
+            self.common.log('Unable to write metrics file: {0}'.format(str(ex)), 'warning')
 
 
 def main():
     try:
         ytaudio = YTAudio()
-        ytaudio.yt_audio()
+        if ytaudio.args.get('daemon'):
+            SyncDaemon(ytaudio).run()
+        else:
+            ytaudio.yt_audio()
     except KeyboardInterrupt:
         print("\nInterrupted by user. Aborting!\n")
         sys.exit(1)
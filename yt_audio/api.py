@@ -0,0 +1,130 @@
+import copy
+import threading
+
+from .common import Common
+from .YTAudio import YTAudio
+
+
+class SyncError(Exception):
+    """
+    Raised when sync can't be started (invalid options)
+    """
+    pass
+
+
+class Syncer:
+    """
+    Python API to sync playlists without running yt-audio CLI. A Syncer keeps
+    engine, caches (playlist info, ffprobe, dependency checks), archive indexes
+    and lease queues across sync() calls, so one long-running process can serve
+    many sync requests.
+
+    Options are config file keys in lowercase (e.g. {'output_directory': '~/Music',
+    'use_archive': True, 'download_workers': 2}). Config file is only read if
+    config_path is given (options override it). Nothing is printed unless quiet=False.
+    Rate limiter and dashboard are shared by all calls (created on first use,
+    removed by a call that does not enable them).
+
+    Example:
+        >>> syncer = Syncer({'output_directory': '/srv/music', 'use_archive': True})
+        >>> for result in syncer.sync(['https://www.youtube.com/playlist?list=...']):
+        ...     print(result['url'], result['downloaded'], result['failed'])
+    """
+
+    def __init__(self, options=None, config_path=None, quiet=True):
+        self.common = Common()
+        self.common.quiet = quiet
+        self.config = self.common.read_config(config_path) if config_path else {'DEFAULT': {}}
+        self.options = dict(options or {})
+        self.info_cache = None
+        self.lease_queues = {}
+        self._lock = threading.Lock()
+
+    def _ytaudio(self, options):
+        """
+        Resolve options into YTAudio instance sharing state of previous calls
+        """
+        with self._lock:
+            try:
+                ytaudio = YTAudio(args=options, config=self.config, common=self.common)
+            except Exception as ex:
+                raise SyncError(str(ex).strip()) from ex
+            if self.info_cache is None:
+                self.info_cache = ytaudio.info_cache
+            ytaudio.info_cache = self.info_cache
+            ytaudio.lease_queues = self.lease_queues
+            return ytaudio
+
+    def sync(self, playlists, options=None):
+        """
+        Sync playlist(s)/video(s). Info of all URL(s) is fetched in parallel
+        (PLAYLIST_WORKERS), then URL(s) are synced one after another. Calls
+        from several threads run concurrently.
+
+        Parameters:
+        ==========
+        > playlists (list/string): URL(s) with (optional) save directory [URL::dir]
+
+        > options (dict)(optional): Options overriding Syncer options for this call
+
+        Returns:
+        =======
+        > (list) result (dict) of each URL:
+            url, directory, downloaded (int), failed (int),
+            error (string, None if URL was synced),
+            tracks (list of dict: id, url, status, title, path, reason), where
+            status is 'downloaded', 'placed' (from audio store), 'skipped' (already
+            downloaded), 'deferred' (waiting for retry/parked in journal) or 'failed'
+
+        Raises:
+        ======
+        > SyncError: Invalid options
+
+        > DependencyError: ffmpeg/ffprobe not available (youtube-dl errors, including
+        missing youtube-dl, are returned as URL result's error)
+        """
+        if isinstance(playlists, str):
+            playlists = [playlists]
+        _options = dict(self.options)
+        _options.update(options or {})
+        _options['url_list'] = list(playlists)
+        ytaudio = self._ytaudio(_options)
+
+        _resolved_urls = [ytaudio.resolve_url(x) for x in ytaudio.url_list]
+        _infos = ytaudio.prefetch_info(_resolved_urls)
+        _results = []
+        try:
+            for (url, directory), (out, error) in zip(_resolved_urls, _infos):
+                _results.append(self._sync_url(ytaudio, url, directory, out, error))
+        finally:
+            if ytaudio.info_cache:
+                ytaudio.info_cache.save()
+            ytaudio.write_metrics()
+        return _results
+
+    def _sync_url(self, ytaudio, url, directory, out, error):
+        _ytaudio = copy.copy(ytaudio)
+        _ytaudio.results = {}
+        with self.common.metrics.phase('sync', url):
+            _result = _ytaudio.run_sync(url, directory, out, error)
+        return {'url': url, 'directory': _ytaudio.output_directory,
+                'downloaded': _result[0] if _result else 0,
+                'failed': _result[1] if _result else 0,
+                'error': _ytaudio.error,
+                'tracks': [x for x in _ytaudio.results.values() if x['status'] != 'pending']}
+
+
+_default_syncer = None
+_default_lock = threading.Lock()
+
+
+def sync(playlists, options=None):
+    """
+    Sync playlist(s)/video(s) with shared Syncer (created on first call, so
+    caches and indexes are reused by later calls). See Syncer.sync().
+    """
+    global _default_syncer
+    with _default_lock:
+        if _default_syncer is None:
+            _default_syncer = Syncer()
+    return _default_syncer.sync(playlists, options)
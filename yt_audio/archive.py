@@ -0,0 +1,98 @@
+from urllib.parse import parse_qs, urlparse
+
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com',
+                 'music.youtube.com', 'youtube-nocookie.com', 'www.youtube-nocookie.com')
+
+
+class ArchiveIndex:
+    """
+    In-memory index of youtube-dl archive file(s) keyed by (extractor, video id).
+    Archive files are streamed line by line; malformed lines are skipped.
+    """
+
+    def __init__(self):
+        self.entries = set()
+        self.malformed = 0
+
+    def load(self, archive_file, offset=0):
+        """
+        Add entries of archive file to index
+
+        Parameters:
+        ==========
+        > archive_file (string): Archive file path
+
+        > offset (int)(optional): Byte offset to start reading from
+        (to load lines appended since last load)
+
+        Returns:
+        =======
+        > (int) Byte offset of last complete line read or None if archive file does not exist
+        """
+        try:
+            with open(archive_file, 'rb') as archive:
+                archive.seek(offset)
+                for line in archive:
+                    if not line.endswith(b'\n'):
+                        # Incomplete line (being written), read on next load
+                        break
+                    offset = offset + len(line)
+                    parts = line.decode('utf-8', 'replace').split()
+                    if not parts:
+                        continue
+                    if len(parts) != 2:
+                        self.malformed = self.malformed + 1
+                        continue
+                    self.add(parts[0], parts[1])
+            return offset
+        except FileNotFoundError:
+            return None
+
+    def add(self, extractor, video_id):
+        self.entries.add((extractor.lower(), video_id))
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def contains_url(self, url):
+        """
+        Check if URL is present in index. URL(s) that cannot be mapped to an
+        archive key are reported as not present (youtube-dl re-checks these).
+        """
+        key = self.url_key(url)
+        return key is not None and key in self.entries
+
+    @staticmethod
+    def url_key(url):
+        """
+        Get archive key (extractor, video id) for URL
+
+        Parameters:
+        ==========
+        > url (string): Video URL
+
+        Returns:
+        =======
+        > (tuple) (extractor, video id) or None
+        """
+        try:
+            parsed = urlparse(url)
+        except ValueError:
+            return None
+        host = parsed.netloc.lower().split(':')[0]
+        video_id = None
+        if host in YOUTUBE_HOSTS:
+            if parsed.path == '/watch':
+                video_id = parse_qs(parsed.query).get('v', [None])[0]
+            else:
+                parts = [x for x in parsed.path.split('/') if x]
+                if len(parts) == 2 and parts[0] in ('embed', 'shorts', 'v', 'live'):
+                    video_id = parts[1]
+        elif host == 'youtu.be':
+            video_id = parsed.path.strip('/') or None
+        if not video_id:
+            return None
+        return 'youtube', video_id
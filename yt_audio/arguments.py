@@ -36,6 +36,54 @@ def get_args(config):
                          nargs='?', help="File output format")
     options.add_argument("--ytdl-args", nargs='?', dest='ytdl_additional_args',
                          help="youtube-dl additional arguments")
+    options.add_argument("--playlist-workers", type=int, dest='playlist_workers', metavar='N',
+                         help="no. of URL(s) to fetch info for in parallel")
+    options.add_argument("--download-workers", type=int, dest='download_workers', metavar='N',
+                         help="no. of youtube-dl processes to split downloads across")
+    options.add_argument("--info-ttl", type=int, dest='playlist_info_ttl', metavar='SECONDS',
+                         help="reuse cached playlist info younger than SECONDS")
+    options.add_argument("--refresh", action='store_true', dest='refresh',
+                         help="ignore cached playlist info")
+    options.add_argument("--stream", action='store_true', dest='stream',
+                         help="start downloading while playlist entries are being listed")
+    options.add_argument("--daemon", action='store_true', dest='daemon',
+                         help="keep running and sync URL(s) periodically (see SYNC_INTERVAL)")
+    options.add_argument("--metrics-file", dest='metrics_file', metavar='PATH',
+                         help="write per-phase timings/counts to PATH")
+    options.add_argument("--metrics-format", dest='metrics_format', choices=['json', 'prometheus'],
+                         help="metrics file format (json report or Prometheus textfile)")
+    options.add_argument("--dashboard", action='store_true', dest='dashboard',
+                         help="show live download throughput, queue depth and ETA")
+    options.add_argument("--dashboard-interval", type=float, dest='dashboard_interval', metavar='SECONDS',
+                         help="seconds between progress updates (with --dashboard/--progress-json)")
+    options.add_argument("--progress-json", dest='progress_json', metavar='PATH',
+                         help="append download progress to PATH as JSON lines")
+    options.add_argument("--lease-queue", action='store_true', dest='lease_queue',
+                         help="coordinate titles with other yt-audio processes syncing into same directory")
+    options.add_argument("--rate-limit", action='store_true', dest='rate_limit',
+                         help="schedule all youtube-dl requests through adaptive rate limiter")
+    options.add_argument("--request-rate", type=float, dest='request_rate', metavar='N',
+                         help="max. requests (info fetches/titles) per second (with --rate-limit)")
+    options.add_argument("--byte-rate", dest='byte_rate', metavar='RATE',
+                         help="max. download rate, e.g. 2M (with --rate-limit)")
+    options.add_argument("--pipeline", action='store_true', dest='pipeline',
+                         help="download audio streams only and transcode them in a separate ffmpeg pool")
+    options.add_argument("--transcode-workers", type=int, dest='transcode_workers', metavar='N',
+                         help="no. of parallel ffmpeg processes in pipeline mode (default: no. of CPUs)")
+    options.add_argument("--media-cache", action='store_true', dest='media_cache',
+                         help="embed thumbnails from local cache (and metadata, with --pipeline)")
+    options.add_argument("--journal", action='store_true', dest='use_journal',
+                         help="record download state to resume interrupted syncs and retry failed titles")
+    options.add_argument("--retry-parked", action='store_true', dest='retry_parked',
+                         help="retry titles parked after repeated failures (with --journal)")
+    options.add_argument("--batch-file", action='store_true', dest='url_batch_file',
+                         help="always pass URL(s) to youtube-dl in a batch file (-a)")
+    options.add_argument("--download-batch-size", type=int, dest='download_batch_size', metavar='N',
+                         help="max. no. of titles per youtube-dl process for very large downloads")
+    options.add_argument("--audio-store", dest='audio_store', metavar='DIR',
+                         help="download each title once into DIR and link/copy it into playlist directories")
+    options.add_argument("--engine", dest='engine', choices=['subprocess', 'embedded', 'asyncio'],
+                         help="run youtube-dl as subprocess, in-process (embedded) or as asyncio subprocess")
 
     cargs = custom_args(config, required)
     args = vars(parser.parse_args())
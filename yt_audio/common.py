@@ -1,9 +1,30 @@
 import configparser
 import json
 import os
+import queue
+import re
+import shutil
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path, PurePath
 
+from .archive import ArchiveIndex
+from .dashboard import Dashboard
+from .engine import DONE_MARKER, SubprocessEngine
+from .locking import FileLock
+from .metrics import Metrics
+from .store import AudioStore
+from .tags import UnsupportedFormat, read_purl
+
+
+class DependencyError(Exception):
+    """
+    Raised when a required dependency (executable) is not available
+    """
+    pass
+
 
 class Common:
     """
@@ -16,12 +37,62 @@ class Common:
         'playlist_info_command': 'youtube-dl --flat-playlist -J $PLAYLIST_URL$',
         'output_format': '%%(title)s.%%(ext)s',
         'ffprobe_command': 'ffprobe -v quiet -print_format json -show_format -hide_banner "$PATH$"',
-        'output_directory': str(PurePath(Path.home(), "Music"))
+        'output_directory': str(PurePath(Path.home(), "Music")),
+        'playlist_workers': 4,
+        'download_workers': 1,
+        'engine': 'subprocess',
+        'playlist_info_ttl': 0,
+        'playlist_stream_command': 'youtube-dl --flat-playlist --dump-json $PLAYLIST_URL$',
+        'stream': False,
+        'stream_batch_size': 10,
+        'sync_interval': 3600,
+        'sync_jitter': 0.1,
+        'daemon_workers': 2,
+        'metrics_format': 'json',
+        'command_timeout': 0,
+        'download_idle_timeout': 0,
+        'audio_store_link': 'auto',
+        'retry_backoff': 300,
+        'retry_max_backoff': 86400,
+        'retry_max_attempts': 5,
+        'pipeline': False,
+        'transcode_workers': 0,
+        'rate_limit': False,
+        'request_rate': 0,
+        'byte_rate': 0,
+        'max_concurrency': 4,
+        'throttle_pause': 30,
+        'lease_queue': False,
+        'lease_ttl': 120,
+        'url_batch_file': 'auto',
+        'download_batch_size': 1000,
+        'dashboard': False,
+        'dashboard_interval': 5,
+        'media_cache': False,
+        'media_cache_size': '500M'
+    }
+
+    # youtube-dl error of a title: 'ERROR: [extractor] <video id>: ...'
+    ERROR_ID_PATTERN = re.compile(r'\[[^\]]+\] ([\w-]+): ')
+
+    DEPENDENCIES = {
+        'ffmpeg': ['ffmpeg -version', 'avconv -version'],
+        'ffprobe': ['ffprobe -version', 'avprobe -version'],
+        'youtube-dl': ['youtube-dl --version']
     }
 
     def __init__(self):
         self.ffprobe = True
         self.avprobe = True
+        self._dependencies = {}
+        self._dependency_lock = threading.Lock()
+        self._archive_indexes = {}
+        self._archive_lock = threading.Lock()
+        self.engine = SubprocessEngine(self)
+        self.metrics = Metrics()
+        self.limiter = None
+        self.dashboard = None
+        self.quiet = False
 
     def ExecuteCommand(self, command, is_shell=False, single_line=False):
         """
@@ -61,7 +132,8 @@ class Common:
 
     def get_file_url(self, path, command):
         """
-        Reads file's metadata and returns URL
+        Reads file's metadata and returns URL. Tags of mp3/m4a/ogg/opus files
+        are read in-process; other formats are read with ffprobe.
 
         Parameters:
         ==========
@@ -74,37 +146,406 @@ class Common:
         =======
         > (string) URL
         """
-        try:
-            result = next(self.ExecuteCommand(
-                command.replace('$PATH$', path), True))
-            result = json.loads(result)
-            return result['format']['tags']['purl']
-        except KeyError:
-            return None
+        return self.get_file_urls([path], command)[path]
 
-    def download_audio(self, download_command, title_count):
+    def get_file_urls(self, paths, command):
+        """
+        Reads metadata of files and returns URL(s). Tags are read in-process where
+        possible; remaining files are read with ffprobe (concurrently, if engine
+        supports it).
+
+        Parameters:
+        ==========
+        > paths (list): Absolute file paths
+
+        > command (string): ffprobe command to get purl from file
+
+        Returns:
+        =======
+        > (dict) file path: URL (or None)
+        """
+        urls = {}
+        _probe = []
+        for path in paths:
+            try:
+                urls[path] = read_purl(path)
+            except UnsupportedFormat:
+                _probe.append(path)
+        if not _probe:
+            return urls
+        if self.require('ffprobe') == 'avprobe':
+            command = command.replace('ffprobe', 'avprobe')
+        _results = self.engine.run_commands(
+            [command.replace('$PATH$', path) for path in _probe])
+        for path, result in zip(_probe, _results):
+            try:
+                urls[path] = json.loads(result)['format']['tags']['purl']
+            except (KeyError, TypeError, ValueError):
+                urls[path] = None
+        return urls
+
+    def download_audio(self, download_command, title_count, progress=None):
         """
         Downloads file to specified path
 
         Parameters:
         ==========
-        > download_command (string): youtube-dl download command
+        > download_command (string/list): youtube-dl download command. A list of
+        commands is run in parallel (one worker process per command).
 
-        > title_count (int): no. of titles to download
+        > title_count (int): no. of titles to download (across all commands)
+
+        > progress (dict)(optional): download progress to report into (see new_progress())
+
+        Returns:
+        =======
+        > (tuple) no. of titles downloaded, no. of titles failed
         """
         try:
-            count = 1
-            print("Download begin\n")
-            for download in self.ExecuteCommand(download_command, True, True):
-                print("[{0}/{1}] ".format(count, title_count) +
-                      json.loads(download)["title"])
-                count = count + 1
-            print("\nDownload complete!\n")
-        except json.JSONDecodeError as ex:
-            self.log(ex.doc, 'error')
+            if isinstance(download_command, str):
+                download_command = [download_command]
+            if progress is None:
+                progress = self.new_progress(title_count)
+            self.log("Download begin\n")
+            if len(download_command) == 1:
+                self._download_worker(download_command[0], progress)
+            elif hasattr(self.engine, 'download_many') and not self.limiter:
+                self.engine.download_many(
+                    download_command,
+                    lambda line, worker: self._handle_download_line(line, progress, worker))
+                for _worker in range(len(download_command)):
+                    self._finish_title(progress, _worker)
+            else:
+                with ThreadPoolExecutor(max_workers=len(download_command)) as executor:
+                    for _worker, _command in enumerate(download_command):
+                        executor.submit(self._download_worker,
+                                        _command, progress, _worker)
+            self.wait_jobs(progress)
+            self.log("\nDownload complete!\n")
+            return self.download_summary(progress)
         except Exception as ex:
             raise ex
 
+    def new_progress(self, title_count=0, on_download=None, on_error=None):
+        """
+        Create download progress shared between download workers.
+        on_download(info) (optional) is called with --print-json info of every downloaded title
+        (once it is post-processed), on_error(message) (optional) with every error reported
+        by youtube-dl.
+        Progress is reported by dashboard (if enabled) until download_summary().
+        """
+        progress = {'count': 0, 'total': title_count, 'bytes': 0, 'lock': threading.Lock(),
+                    'on_download': on_download, 'on_error': on_error, 'pending': {}}
+        if self.dashboard:
+            self.dashboard.attach(progress)
+        return progress
+
+    def wait_jobs(self, progress):
+        """
+        Wait for post-download jobs (progress['jobs'], e.g. transcoding) to finish
+        """
+        _jobs = progress.get('jobs') or []
+        if _jobs and any(not x.done() for x in _jobs):
+            self.log("\nWaiting for {0} title(s) to be processed...".format(
+                len([x for x in _jobs if not x.done()])))
+        for job in _jobs:
+            job.result()
+
+    def download_summary(self, progress):
+        """
+        Log and return (downloaded, failed) count of download progress
+        """
+        if self.dashboard:
+            self.dashboard.detach(progress)
+        downloaded = progress['count']
+        failed = max(0, progress['total'] - downloaded)
+        if failed:
+            self.log('{0} of {1} record(s) failed to download.\n'.format(
+                failed, progress['total']), 'warning')
+        return downloaded, failed
+
+    def download_stream(self, url_queue, build_command, workers, batch_size, progress, batch_wait=2):
+        """
+        Download URL(s) from queue while it is being filled. Each worker collects
+        a batch of URL(s) (up to batch_size, or whatever arrived within batch_wait
+        seconds) and downloads them with a single youtube-dl process.
+        Workers stop when they receive None from queue (one None per worker).
+
+        Parameters:
+        ==========
+        > url_queue (queue.Queue): URL(s) to download
+
+        > build_command (function): build_command(urls, worker_id) returns download command
+        (or None to skip batch)
+
+        > workers (int): no. of download workers
+
+        > batch_size (int): max. no. of URL(s) per youtube-dl process
+
+        > progress (dict): download progress (see new_progress())
+        """
+        def _worker(worker_id):
+            done = False
+            while not done:
+                _url = url_queue.get()
+                if _url is None:
+                    break
+                _batch = [_url]
+                while len(_batch) < batch_size:
+                    try:
+                        _url = url_queue.get(timeout=batch_wait)
+                    except queue.Empty:
+                        break
+                    if _url is None:
+                        done = True
+                        break
+                    _batch.append(_url)
+                _command = build_command(_batch, worker_id)
+                if _command:
+                    self._download_worker(_command, progress, worker_id)
+
+        _threads = [threading.Thread(target=_worker, args=(i,), daemon=True)
+                    for i in range(workers)]
+        for _thread in _threads:
+            _thread.start()
+        return _threads
+
+    def _download_worker(self, download_command, progress, worker=0):
+        """
+        Run a single youtube-dl download process and report its progress
+        into the shared progress counter.
+        """
+        if self.dashboard:
+            self.dashboard.bind(worker if self.dashboard.reports(progress) else None)
+        try:
+            if self.limiter:
+                # Request tokens are charged per downloaded title
+                with self.limiter.slot(0):
+                    for download in self.engine.download(download_command):
+                        self._handle_download_line(download, progress, worker)
+            else:
+                for download in self.engine.download(download_command):
+                    self._handle_download_line(download, progress, worker)
+        except Exception as ex:
+            with progress['lock']:
+                self.log(str(ex), 'error')
+            if progress.get('on_error'):
+                progress['on_error'](str(ex))
+        self._finish_title(progress, worker)
+
+    def _handle_download_line(self, download, progress, worker=0):
+        """
+        Report a single download output line into progress. youtube-dl prints
+        --print-json info of a title before downloading it; title is downloaded
+        when DONE_MARKER line follows (printed after post-processing). youtube-dl
+        progress lines (--newline) are reported to dashboard, other status
+        lines ('[extractor] ...') are ignored. Only ERROR lines are reported as
+        errors; warnings and other output are just logged.
+        """
+        _message = str(download, 'utf-8', 'replace').strip()
+        if _message.startswith(DONE_MARKER):
+            self._complete_title(progress, worker, _message[len(DONE_MARKER):].strip().strip('"'))
+            return
+        try:
+            _info = json.loads(download)
+        except ValueError:
+            _info = None
+        if not isinstance(_info, dict) or 'title' not in _info:
+            if not _message:
+                return
+            if _message.startswith('['):
+                _status = Dashboard.parse_progress(_message)
+                if _status and self.dashboard and self.dashboard.reports(progress):
+                    self.dashboard.update(worker, *_status)
+                return
+            if not _message.startswith('ERROR'):
+                # Warnings and other output don't fail title
+                with progress['lock']:
+                    if _message.startswith('WARNING'):
+                        self.log(_message.replace('WARNING:', '', 1).strip(), 'warning')
+                    else:
+                        self.log(_message)
+                return
+            with progress['lock']:
+                _pending = progress['pending'].get(worker)
+                if _pending is not None:
+                    _pending['_error'] = _message
+            if _pending is None and self.dashboard and self.dashboard.reports(progress):
+                # Title failed before its info was printed
+                self.dashboard.finish(worker, failed=True)
+            with progress['lock']:
+                self.log(_message, 'error')
+            if self.limiter and self.limiter.is_throttled(_message):
+                self.report_throttle()
+            if progress.get('on_error'):
+                progress['on_error'](_message)
+            return
+        # Worker went on to next title: previous one was not completed
+        self._finish_title(progress, worker)
+        with progress['lock']:
+            progress['pending'][worker] = _info
+        if self.dashboard and self.dashboard.reports(progress) and _info.get('_filename'):
+            self.dashboard.start(worker, _info['_filename'], self.get_download_size(_info))
+
+    def _finish_title(self, progress, worker):
+        """
+        Fail title of worker still waiting for DONE_MARKER (called when worker
+        starts next title and when its process exits)
+        """
+        with progress['lock']:
+            _info = progress['pending'].pop(worker, None)
+        if _info is not None:
+            self._fail_title(progress, worker, _info, 'download was not completed')
+
+    def _fail_title(self, progress, worker, info, reason):
+        """
+        Report title failed after its info was printed (reason is reported
+        unless youtube-dl already reported an error for title)
+        """
+        if self.dashboard and self.dashboard.reports(progress):
+            self.dashboard.finish(worker, failed=True)
+        _error = info.get('_error')
+        if _error and self.ERROR_ID_PATTERN.search(_error):
+            return
+        if _error:
+            # Download/post-processing errors do not name the title
+            reason = _error.replace('ERROR:', '', 1).strip()
+        _message = 'ERROR: [{0}] {1}: {2}'.format(
+            info.get('extractor') or 'download', info.get('id'), reason)
+        if not _error:
+            with progress['lock']:
+                self.log('{0} ({1})'.format(_message, info['title']), 'error')
+        if progress.get('on_error'):
+            progress['on_error'](_message)
+
+    def _complete_title(self, progress, worker, path):
+        """
+        Report title of worker downloaded (DONE_MARKER with file path received)
+        """
+        with progress['lock']:
+            _info = progress['pending'].pop(worker, None)
+        if _info is None:
+            return
+        if path and os.path.isfile(path):
+            _info['filepath'] = path
+        elif (_info.get('_filename') or _info.get('filepath')) and \
+                not AudioStore.find_download(_info):
+            self._fail_title(progress, worker, _info, 'downloaded file not found')
+            return
+        _title = _info['title']
+        _bytes = self.get_download_size(_info)
+        if self.dashboard and self.dashboard.reports(progress):
+            self.dashboard.finish(worker)
+        if self.limiter:
+            self.limiter.success(_bytes, 1)
+        with progress['lock']:
+            progress['count'] = progress['count'] + 1
+            progress['bytes'] = progress['bytes'] + _bytes
+            self.log("[{0}/{1}] ".format(progress['count'], progress['total']) + _title)
+        if progress.get('on_download'):
+            try:
+                progress['on_download'](_info)
+            except Exception as ex:
+                with progress['lock']:
+                    self.log('{0}: {1}'.format(_title, str(ex)), 'warning')
+
+    def report_throttle(self):
+        """
+        Report throttling (HTTP 429) to rate limiter
+        """
+        self.metrics.add('throttle', items=1)
+        if self.limiter.throttled():
+            self.log('Throttled by server (HTTP 429). Concurrency reduced to {0}, '
+                     'pausing new requests.'.format(self.limiter.limit), 'warning')
+
+    @staticmethod
+    def parse_size(value):
+        """
+        Parse size/rate with optional K/M/G suffix (e.g. '500K', '2M') into bytes
+        """
+        if isinstance(value, bool):
+            # Config values '0'/'1' are read as booleans (see get_value())
+            return int(value)
+        value = str(value).strip()
+        if not value:
+            return 0
+        _units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+        if value[-1].upper() in _units:
+            return int(float(value[:-1]) * _units[value[-1].upper()])
+        return int(float(value))
+
+    @staticmethod
+    def get_download_size(info):
+        """
+        Get size (bytes) of downloaded title from youtube-dl info (0 if unknown)
+        """
+        _size = info.get('filesize') or info.get('filesize_approx')
+        if _size:
+            return int(_size)
+        for key in ('filepath', '_filename'):
+            try:
+                return os.path.getsize(info[key])
+            except (KeyError, TypeError, OSError):
+                continue
+        return 0
+
+    def merge_archive(self, archive_file, part_files):
+        """
+        Append worker archive files to main archive file (under file lock)
+        and remove worker archive files.
+
+        Parameters:
+        ==========
+        > archive_file (string): Main archive file path
+
+        > part_files (list): Worker archive file paths
+        """
+        with FileLock(archive_file):
+            with open(archive_file, 'a') as archive:
+                for part_file in part_files:
+                    try:
+                        with open(part_file) as part:
+                            for line in part:
+                                if line.strip():
+                                    archive.write(line if line.endswith(
+                                        '\n') else line + '\n')
+                        os.remove(part_file)
+                    except FileNotFoundError:
+                        pass
+
+    def write_batch_file(self, urls):
+        """
+        Write URL(s) to temporary youtube-dl batch file (-a), one URL per line
+
+        Returns:
+        =======
+        > (string) Batch file path
+        """
+        _fd, _path = tempfile.mkstemp(prefix='yt-audio-urls-', suffix='.txt')
+        with os.fdopen(_fd, 'w') as batch_file:
+            batch_file.write('\n'.join(urls) + '\n')
+        return _path
+
+    @staticmethod
+    def remove_files(paths):
+        """
+        Remove files (missing files are ignored)
+        """
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def append_archive(self, archive_file, entries):
+        """
+        Append entries ('extractor video_id') to archive file (under file lock)
+        """
+        with FileLock(archive_file):
+            with open(archive_file, 'a') as archive:
+                for entry in entries:
+                    archive.write(entry + '\n')
+
     def get_configfile_path(self, config_custom_path):
         """
         Get configuration file absolute path
@@ -122,6 +563,16 @@ class Common:
             path = str(PurePath(config_path, file_path))
             return path
 
+    def get_cache_path(self):
+        """
+        Get cache directory absolute path ($XDG_CACHE_HOME/yt-audio or $HOME/.cache/yt-audio)
+        """
+        try:
+            path = os.environ["XDG_CACHE_HOME"]
+        except KeyError:
+            path = str(PurePath(Path.home(), ".cache"))
+        return str(PurePath(path, "yt-audio"))
+
     def read_config(self, config_custom_path=''):
         """
         Read config file and return result as dictionary
@@ -141,7 +592,11 @@ class Common:
         > message (string): Message to log
 
         > message_type (string)(optional): Type of message ('error'/'warning'/'info'/[empty=unformatted])
+
+        Nothing is logged if quiet is set (e.g. when used as library, see api.Syncer)
         """
+        if self.quiet:
+            return
         if message_type == 'error':
             if 'ERROR' in message:
                 message = message.replace('ERROR:', '\033[31mError:\033[0m')
@@ -201,48 +656,147 @@ class Common:
             pass
 
     def check_dependencies(self):
-        _dependencies = ["ffmpeg -version|avconv -version",
-                         "ffprobe -version|avprobe -version",
-                         "youtube-dl --version",
-                         ]
-        for _dep in _dependencies:
+        """
+        Check all dependencies. Exits if any dependency is not available.
+        """
+        for _dep in self.DEPENDENCIES:
             try:
-                if len(_dep.split('|')) > 1:
-                    _not_found = []
-                    for opt in _dep.split('|'):
-                        try:
-                            res = next(self.ExecuteCommand(opt))
-                            if res:
-                                break
-                        except FileNotFoundError:
-                            _file = opt.split(' ')[0]
-                            _not_found.append(_file)
-                            if _file == 'ffprobe':
-                                self.ffprobe = False
-                            elif _file == 'avprobe':
-                                self.avprobe = False
-                            pass
-                    if len(_not_found) == len(_dep.split('|')):
-                        self.log('Either of {0} required. Please install and try again.\n'.format(
-                            '/'.join(_not_found)), 'error')
-                        exit(1)
-
-                else:
-                    next(self.ExecuteCommand(_dep))
-            except FileNotFoundError:
-                self.log('{0} not found. Please install {0} and try again.\n'.format(
-                    _dep.split(' ')[0]), 'error')
+                self.require(_dep)
+            except DependencyError as ex:
+                self.log(str(ex), 'error')
                 exit(1)
-            except Exception as ex:
-                raise ex
 
-    def read_archive(self, archive_file):
+    def require(self, name):
+        """
+        Check (lazily) that dependency is available. Successful checks are cached
+        on disk, keyed by PATH and executable's path and mtime, so the dependency
+        is not executed again until any of them changes.
+
+        Parameters:
+        ==========
+        > name (string): Dependency name (key of DEPENDENCIES)
+
+        Returns:
+        =======
+        > (string) name of available executable (e.g. 'ffprobe' or 'avprobe')
+
+        Raises:
+        ======
+        > DependencyError: No alternative of dependency is available
+        """
+        with self._dependency_lock:
+            if name in self._dependencies:
+                return self._dependencies[name]
+            _cache = self._read_dependency_cache()
+            _not_found = []
+            for command in self.DEPENDENCIES[name]:
+                _executable = command.split(' ')[0]
+                _path = shutil.which(_executable)
+                if not _path:
+                    _not_found.append(_executable)
+                    continue
+                _key = '{0}|{1}|{2}'.format(os.environ.get('PATH', ''), _path,
+                                            os.stat(_path).st_mtime_ns)
+                if _cache.get(_executable) != _key:
+                    try:
+                        next(self.ExecuteCommand(command))
+                    except (FileNotFoundError, PermissionError, StopIteration):
+                        _not_found.append(_executable)
+                        continue
+                    _cache[_executable] = _key
+                    self._write_dependency_cache(_cache)
+                self._dependencies[name] = _executable
+                break
+            if 'ffprobe' in _not_found:
+                self.ffprobe = False
+            if 'avprobe' in _not_found:
+                self.avprobe = False
+            if name not in self._dependencies:
+                if len(_not_found) > 1:
+                    raise DependencyError('Either of {0} required. Please install and try again.\n'.format(
+                        '/'.join(_not_found)))
+                raise DependencyError('{0} not found. Please install {0} and try again.\n'.format(
+                    _not_found[0]))
+            return self._dependencies[name]
+
+    def require_command(self, command):
+        """
+        Check dependency of command (if command runs a known dependency)
+        """
+        _executable = os.path.basename(command.strip().split(' ')[0])
+        for name in self.DEPENDENCIES:
+            if _executable in [x.split(' ')[0] for x in self.DEPENDENCIES[name]]:
+                self.require(name)
+                return
+
+    def _read_dependency_cache(self):
+        try:
+            with open(str(PurePath(self.get_cache_path(), 'dependencies.json'))) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_dependency_cache(self, cache):
         try:
-            with open(archive_file) as archive:
-                data = archive.readlines()
-                return data
-        except FileNotFoundError as ex:
-            self.log(ex.filename + ': ' + ex.strerror, 'warning')
-            self.log("> New archive file '{0}' will be created\n".format(
-                ex.filename), 'info')
-            return None
+            Path(self.get_cache_path()).mkdir(parents=True, exist_ok=True)
+            with open(str(PurePath(self.get_cache_path(), 'dependencies.json')), 'w') as cache_file:
+                json.dump(cache, cache_file)
+        except OSError:
+            pass
+
+    def read_archive(self, archive_file):
+        """
+        Read archive file into an index of downloaded titles. Index of a single
+        archive file is kept in memory; only lines appended since last read are
+        read again (unless archive file was rewritten).
+
+        Parameters:
+        ==========
+        > archive_file (string/list): Archive file path(s)
+
+        Returns:
+        =======
+        > (ArchiveIndex) archive index or None if no archive file exists
+        """
+        if isinstance(archive_file, str):
+            return self._read_archive_cached(archive_file)
+        index = ArchiveIndex()
+        found = False
+        for path in archive_file:
+            if index.load(path) is not None:
+                found = True
+            else:
+                self._log_missing_archive(path)
+        if index.malformed:
+            self.log('{0} malformed line(s) ignored in archive file(s)'.format(
+                index.malformed), 'warning')
+        return index if found else None
+
+    def _read_archive_cached(self, archive_file):
+        with self._archive_lock:
+            try:
+                _stat = os.stat(archive_file)
+            except FileNotFoundError:
+                self._archive_indexes.pop(archive_file, None)
+                self._log_missing_archive(archive_file)
+                return None
+            index, offset, inode = self._archive_indexes.get(
+                archive_file, (None, 0, None))
+            if index is None or inode != _stat.st_ino or _stat.st_size < offset:
+                index, offset = ArchiveIndex(), 0
+            _malformed = index.malformed
+            offset = index.load(archive_file, offset)
+            if offset is None:
+                self._archive_indexes.pop(archive_file, None)
+                self._log_missing_archive(archive_file)
+                return None
+            self._archive_indexes[archive_file] = (index, offset, _stat.st_ino)
+            if index.malformed > _malformed:
+                self.log('{0} malformed line(s) ignored in archive file(s)'.format(
+                    index.malformed - _malformed), 'warning')
+            return index
+
+    def _log_missing_archive(self, path):
+        self.log(path + ': No such file or directory', 'warning')
+        self.log("> New archive file '{0}' will be created\n".format(
+            path), 'info')
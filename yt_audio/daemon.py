@@ -0,0 +1,161 @@
+import ast
+import copy
+import heapq
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .arguments import get_args
+
+
+class SyncDaemon:
+    """
+    Long-running sync. Each URL is synced on its own interval (with jitter),
+    with at most DAEMON_WORKERS syncs running at a time.
+    SIGTERM/SIGINT stops daemon after running syncs finish, SIGHUP reloads config.
+    """
+
+    MAX_WAIT = 60
+
+    def __init__(self, ytaudio):
+        self.ytaudio = ytaudio
+        self.common = ytaudio.common
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._reload = False
+        self._running = set()
+        self._lock = threading.Lock()
+        self.resolve_schedule()
+
+    def resolve_schedule(self):
+        """
+        Read schedule settings from configuration
+        """
+        _config = self.ytaudio.config['DEFAULT']
+        _args = self.ytaudio.args
+        self.interval = int(self.common.get_value(
+            _config, _args, 'sync_interval'))
+        self.jitter = float(self.common.get_value(
+            _config, _args, 'sync_jitter'))
+        self.workers = max(1, int(self.common.get_value(
+            _config, _args, 'daemon_workers')))
+        _overrides = self.common.get_value(
+            _config, _args, 'sync_interval_overrides')
+        self.interval_overrides = ast.literal_eval(
+            _overrides) if _overrides else {}
+
+    def next_run(self, url, now):
+        """
+        Get next sync time of URL (interval +/- jitter)
+        """
+        _interval = int(self.interval_overrides.get(url, self.interval))
+        _jitter = _interval * self.jitter
+        return now + max(1, _interval + random.uniform(-_jitter, _jitter))
+
+    def stop(self, signum=None, frame=None):
+        self._stop.set()
+        self._wakeup.set()
+
+    def request_reload(self, signum=None, frame=None):
+        self._reload = True
+        self._wakeup.set()
+
+    def reload(self):
+        """
+        Reload configuration file. Current configuration is kept if new
+        configuration is invalid.
+        """
+        self._reload = False
+        try:
+            _ytaudio = copy.copy(self.ytaudio)
+            _ytaudio.config = self.common.read_config()
+            _ytaudio.args, _ytaudio.custom_args = get_args(
+                _ytaudio.config['DEFAULT'])
+            _ytaudio.ytdl_required_args = ['-x', '--print-json']
+            _ytaudio.resolve_input()
+            self.ytaudio = _ytaudio
+            self.resolve_schedule()
+            self.common.log('Configuration reloaded.', 'info')
+        except (Exception, SystemExit) as ex:
+            self.common.log(
+                'Configuration reload failed, keeping current configuration: {0}'.format(str(ex)), 'error')
+
+    def schedule(self, now, previous=None):
+        """
+        Build schedule heap for current URL list. URL(s) already scheduled keep
+        their next sync time; new URL(s) are synced immediately.
+        """
+        previous = previous or {}
+        _schedule = []
+        for spec in self.ytaudio.url_list:
+            heapq.heappush(_schedule, (previous.get(spec, now), spec))
+        return _schedule
+
+    def sync(self, spec):
+        """
+        Sync single URL[::DIR] (runs in worker thread)
+        """
+        try:
+            _ytaudio = copy.copy(self.ytaudio)
+            url, directory = _ytaudio.resolve_url(spec)
+            with self.common.metrics.phase('sync', url):
+                _ytaudio.run_sync(url, directory)
+            if _ytaudio.info_cache:
+                _ytaudio.info_cache.save()
+            _ytaudio.write_metrics()
+        except Exception as ex:
+            self.common.log('{0}: {1}'.format(spec, str(ex)), 'error')
+        finally:
+            with self._lock:
+                self._running.discard(spec)
+            self._wakeup.set()
+
+    def run(self):
+        """
+        Run daemon until stopped
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.request_reload)
+
+        self.common.log('Daemon started: {0} URL(s), max. {1} concurrent sync(s)'.format(
+            len(self.ytaudio.url_list), self.workers), 'info')
+        _schedule = self.schedule(time.time())
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while not self._stop.is_set():
+                if self._reload:
+                    self.reload()
+                    _schedule = self.schedule(
+                        time.time(), {spec: due for due, spec in _schedule})
+                now = time.time()
+                _deferred = []
+                while _schedule and _schedule[0][0] <= now:
+                    due, spec = heapq.heappop(_schedule)
+                    with self._lock:
+                        if spec in self._running or len(self._running) >= self.workers:
+                            # Already syncing/no free worker; retry later
+                            _deferred.append((due, spec))
+                            continue
+                        self._running.add(spec)
+                    executor.submit(self.sync, spec)
+                    heapq.heappush(_schedule, (self.next_run(
+                        self.ytaudio.resolve_url(spec)[0], now), spec))
+                for item in _deferred:
+                    heapq.heappush(_schedule, item)
+
+                # Woken up early when a running sync finishes or on signal
+                _timeout = self.MAX_WAIT
+                if _schedule and not _deferred:
+                    _timeout = min(_timeout, max(
+                        0, _schedule[0][0] - time.time()))
+                self._wakeup.wait(_timeout)
+                self._wakeup.clear()
+        finally:
+            self.common.log(
+                'Stopping daemon. Waiting for running sync(s) to finish...', 'info')
+            executor.shutdown(wait=True)
+            self.common.log('Daemon stopped.', 'info')
@@ -0,0 +1,270 @@
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+
+class Dashboard:
+    """
+    Live download progress: bytes/s of every download worker (parsed from
+    youtube-dl's --newline progress lines, reported by embedded engine or
+    polled from size of the partially downloaded file),
+    aggregate throughput, queue depth and ETA. A reporter thread prints a
+    status line to console and/or appends a JSON line to a file every
+    `interval` seconds while a download is running. One download is reported
+    at a time (with concurrent syncs, the one started first).
+    """
+
+    # [download]  45.2% of ~3.50MiB at  1.20MiB/s ETA 00:03
+    PROGRESS_PATTERN = re.compile(
+        r'^\[download\]\s+(?P<percent>[\d.]+)%\s+of\s+~?\s*(?P<total>[\d.]+\s*[KMGTPEZY]?i?B)'
+        r'(?:\s+at\s+(?:(?P<speed>[\d.]+\s*[KMGTPEZY]?i?B)/s|Unknown speed))?')
+    SIZE_PATTERN = re.compile(r'^([\d.]+)\s*([KMGTPEZY]?)(i?)B$')
+    UNITS = 'KMGTPEZY'
+
+    def __init__(self, interval=5, console=True, json_path=None):
+        self.configure(interval, console, json_path)
+        self.progress = None
+        self.started = None
+        self.failed = 0
+        self.workers = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def parse_size(cls, value):
+        """
+        Parse youtube-dl formatted size (e.g. '3.50MiB', '120KB') into bytes
+        """
+        match = cls.SIZE_PATTERN.match(value.replace(' ', ''))
+        if not match:
+            return 0
+        _base = 1024 if match.group(3) else 1000
+        _power = cls.UNITS.index(match.group(2)) + 1 if match.group(2) else 0
+        return int(float(match.group(1)) * _base ** _power)
+
+    @classmethod
+    def format_size(cls, value):
+        """
+        Format bytes youtube-dl style (e.g. 3.50MiB)
+        """
+        value = float(value or 0)
+        if value < 1024:
+            return '{0:.0f}B'.format(value)
+        for unit in cls.UNITS:
+            value = value / 1024
+            if value < 1024 or unit == cls.UNITS[-1]:
+                return '{0:.2f}{1}iB'.format(value, unit)
+
+    @classmethod
+    def parse_progress(cls, line):
+        """
+        Parse youtube-dl progress line
+
+        Returns:
+        =======
+        > (tuple) downloaded bytes, total bytes, speed (bytes/s) or None if line
+        is not a progress line
+        """
+        match = cls.PROGRESS_PATTERN.match(line)
+        if not match:
+            return None
+        _total = cls.parse_size(match.group('total'))
+        _speed = cls.parse_size(match.group('speed')) if match.group('speed') else 0
+        return int(_total * float(match.group('percent')) / 100), _total, _speed
+
+    def configure(self, interval=5, console=True, json_path=None):
+        """
+        Update reporting settings (interval in seconds, console output, JSON lines file)
+        """
+        self.interval = max(0.5, float(interval))
+        self.console = console
+        self.json_path = json_path
+
+    def bind(self, worker):
+        """
+        Set worker label of current thread (used by reports without explicit
+        worker), None if thread's download is not reported
+        """
+        self._local.worker = worker
+
+    def current_worker(self):
+        return getattr(self._local, 'worker', None)
+
+    def reports(self, progress):
+        """
+        Whether download progress is the one being reported
+        """
+        return progress is not None and self.progress is progress
+
+    def attach(self, progress):
+        """
+        Report download progress (see Common.new_progress()) from now on and
+        start reporter thread. Ignored while another download is reported.
+        """
+        with self._lock:
+            if self.progress is not None:
+                return
+            self.progress = progress
+            self.started = time.monotonic()
+            self.failed = 0
+            self.workers = {}
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._report_loop, name='yt-audio-dashboard', daemon=True)
+            self._thread.start()
+
+    def detach(self, progress):
+        """
+        Report final state of download progress and stop reporting it
+        """
+        if self.progress is not progress:
+            return
+        self.report()
+        with self._lock:
+            self.progress = None
+
+    def start(self, worker, path, total=0):
+        """
+        Report worker started downloading title into path. Until progress is
+        reported by update(), it is polled from size of the file being written.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.workers[worker] = {'bytes': 0, 'total_bytes': total, 'speed': 0,
+                                    'updated': now, 'path': path, 'polled': now}
+
+    def update(self, worker, downloaded, total, speed):
+        """
+        Report progress of title being downloaded by worker
+        """
+        with self._lock:
+            self.workers[worker] = {'bytes': downloaded, 'total_bytes': total,
+                                    'speed': speed, 'updated': time.monotonic()}
+
+    @staticmethod
+    def _file_size(path):
+        """
+        Size of title being downloaded (youtube-dl writes <file>.part, renamed when done)
+        """
+        for _path in (path + '.part', path):
+            try:
+                return os.path.getsize(_path)
+            except OSError:
+                continue
+        return 0
+
+    def poll(self):
+        """
+        Update progress of started titles (see start()) from size of their files
+        """
+        with self._lock:
+            _paths = [(x, y['path']) for x, y in self.workers.items() if y.get('path')]
+        for worker, path in _paths:
+            _size = self._file_size(path)
+            now = time.monotonic()
+            with self._lock:
+                state = self.workers.get(worker)
+                if state is None or state.get('path') != path:
+                    continue
+                if _size > state['bytes']:
+                    state['speed'] = int((_size - state['bytes']) / max(now - state['polled'], 0.001))
+                    state['bytes'] = _size
+                    state['updated'] = now
+                else:
+                    state['speed'] = 0
+                state['polled'] = now
+
+    def finish(self, worker, failed=False):
+        """
+        Report title of worker finished (downloaded or failed)
+        """
+        with self._lock:
+            self.workers.pop(worker, None)
+            if failed:
+                self.failed = self.failed + 1
+
+    def snapshot(self):
+        """
+        Get current state of download progress
+
+        Returns:
+        =======
+        > (dict) state or None if no download is running
+        """
+        with self._lock:
+            progress = self.progress
+            if progress is None:
+                return None
+            now = time.monotonic()
+            _elapsed = max(now - self.started, 0.001)
+            _workers = {}
+            _throughput = 0
+            for worker, state in sorted(self.workers.items(), key=lambda x: str(x[0])):
+                _idle = now - state['updated']
+                # Workers without progress for 2 intervals are stalled (no contribution)
+                _speed = state['speed'] if _idle <= 2 * self.interval else 0
+                _throughput = _throughput + _speed
+                _workers[str(worker)] = {
+                    'speed': _speed, 'bytes': state['bytes'], 'total_bytes': state['total_bytes'],
+                    'percent': round(100.0 * state['bytes'] / state['total_bytes'], 1)
+                    if state['total_bytes'] else None, 'idle': round(_idle, 1)}
+            _done = progress['count']
+            _remaining = max(0, progress['total'] - _done - self.failed)
+            _queue = max(0, _remaining - len(_workers))
+            _eta = None
+            if _done and _throughput and progress['bytes']:
+                _in_flight = sum(x['bytes'] for x in _workers.values())
+                _eta = max(0, _remaining * progress['bytes'] / _done - _in_flight) / _throughput
+            elif _done:
+                _eta = _remaining * _elapsed / _done
+            return {'time': round(time.time(), 3), 'elapsed': round(_elapsed, 1),
+                    'downloaded': _done, 'failed': self.failed, 'total': progress['total'],
+                    'queue': _queue, 'bytes': progress['bytes'],
+                    'throughput': _throughput, 'average_throughput': int(progress['bytes'] / _elapsed),
+                    'eta': round(_eta) if _eta is not None else None, 'workers': _workers}
+
+    def format(self, state):
+        """
+        Format state as single console line
+        """
+        _eta = str(datetime.timedelta(seconds=state['eta'])) if state['eta'] is not None else '?'
+        _parts = ['{0}/{1} titles'.format(state['downloaded'], state['total']),
+                  '{0}/s'.format(self.format_size(state['throughput'])),
+                  'queue {0}'.format(state['queue']), 'ETA {0}'.format(_eta)]
+        for worker, values in state['workers'].items():
+            if values['idle'] > 2 * self.interval:
+                _parts.append('w{0} stalled {1:.0f}s'.format(worker, values['idle']))
+            else:
+                _parts.append('w{0} {1}/s {2}'.format(
+                    worker, self.format_size(values['speed']),
+                    '{0}%'.format(values['percent']) if values['percent'] is not None else ''))
+        return '[progress] ' + ' | '.join(x.strip() for x in _parts)
+
+    def report(self):
+        """
+        Print/write current state (no-op if no download is running)
+        """
+        self.poll()
+        state = self.snapshot()
+        if state is None:
+            return
+        if self.console:
+            print('\033[36m{0}\033[0m'.format(self.format(state)), flush=True)
+        if self.json_path:
+            try:
+                with open(self.json_path, 'a') as json_file:
+                    json_file.write(json.dumps(state) + '\n')
+            except OSError:
+                pass
+
+    def _report_loop(self):
+        while not self._wake.wait(self.interval):
+            self.report()
+
+    def close(self):
+        self._wake.set()
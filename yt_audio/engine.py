@@ -0,0 +1,437 @@
+import json
+import shlex
+import sys
+import threading
+
+from .process import ProcessRunner
+
+try:
+    import youtube_dl
+except ImportError:
+    youtube_dl = None
+
+# youtube-dl prints --print-json info of a title before downloading it, so DONE_ARGS
+# are added to download commands: a DONE_MARKER line (followed by file path) is
+# printed once title is downloaded and post-processed.
+DONE_MARKER = 'yt-audio:done'
+DONE_COMMAND = 'echo {0} {{}}'.format(DONE_MARKER)
+DONE_ARGS = '--exec "{0}"'.format(DONE_COMMAND)
+
+
+class SubprocessEngine:
+    """
+    Runs youtube-dl commands as new processes (one process per command)
+    """
+
+    name = 'subprocess'
+
+    def __init__(self, common):
+        self.common = common
+        self.command_timeout = None
+        self.idle_timeout = None
+
+    def fetch_info(self, command):
+        """
+        Fetch URL info
+
+        Parameters:
+        ==========
+        > command (string): playlist info command (URL substituted)
+
+        Returns:
+        =======
+        > (dict) URL info
+        """
+        self.common.require_command(command)
+        return json.loads(next(self.common.ExecuteCommand(command)))
+
+    def stream_info(self, stream_command, title_command):
+        """
+        Fetch URL info, streaming playlist entries as they are listed
+
+        Parameters:
+        ==========
+        > stream_command (string): command printing one JSON line per entry (URL substituted)
+
+        > title_command (string): playlist info command used to get playlist title
+        (if entries do not contain it), should list few entries (e.g. --playlist-end 1)
+
+        Returns:
+        =======
+        > (dict) URL info. For playlists, 'entries' is a generator of entries.
+        """
+        self.common.require_command(stream_command)
+        lines = self.common.ExecuteCommand(stream_command, single_line=True)
+        first = self._first_entry(lines)
+        if first.get('_type') not in ('url', 'url_transparent'):
+            # Single title
+            return first
+        title = first.get('playlist_title') or first.get('playlist')
+        if not title:
+            title = self.fetch_info(title_command)['title']
+        return {'title': title, 'entries': self._stream_entries(first, lines)}
+
+    @staticmethod
+    def _first_entry(lines):
+        """
+        Read first JSON line of stream command output. Raises ValueError with
+        youtube-dl error output (e.g. HTTP 429) if no entry is received.
+        """
+        errors = []
+        for line in lines:
+            try:
+                return json.loads(line)
+            except ValueError:
+                errors.append(str(line, 'utf-8', 'replace').strip())
+        raise ValueError(' '.join(x for x in errors if x) or 'No info received')
+
+    @staticmethod
+    def _stream_entries(first, lines):
+        yield first
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # youtube-dl warning/error output
+                continue
+
+    def download(self, command):
+        """
+        Download title(s)
+
+        Parameters:
+        ==========
+        > command (string): download command (URL(s)/output substituted)
+
+        Returns:
+        =======
+        > (yield) --print-json output line(s) (bytes)
+        """
+        self.common.require_command(command)
+        return self.common.ExecuteCommand(command, True, True)
+
+    def run_commands(self, commands, is_shell=True):
+        """
+        Run commands and return their output
+
+        Parameters:
+        ==========
+        > commands (list): Commands to execute
+
+        > is_shell (bool): Run commands through shell
+
+        Returns:
+        =======
+        > (list) stdout output (string) of each command ('' if none)
+        """
+        return [next(self.common.ExecuteCommand(command, is_shell), '') for command in commands]
+
+
+class EmbeddedEngine(SubprocessEngine):
+    """
+    Runs youtube-dl in-process using youtube_dl.YoutubeDL. YoutubeDL instances
+    (HTTP session, extractor instances) are reused across calls, one per thread.
+    Commands with arguments that cannot be mapped to YoutubeDL parameters
+    are run as subprocess instead.
+    """
+
+    name = 'embedded'
+
+    # youtube-dl download arguments understood by embedded engine
+    VALUE_ARGS = {'-o': 'output', '--output': 'output', '--audio-format': 'audio_format',
+                  '--audio-quality': 'audio_quality', '--download-archive': 'download_archive',
+                  '--exec': 'exec'}
+    FLAG_ARGS = {'-x': 'extract_audio', '--extract-audio': 'extract_audio', '-q': 'quiet',
+                 '--quiet': 'quiet', '--print-json': 'print_json', '--add-metadata': 'add_metadata',
+                 '--embed-thumbnail': 'embed_thumbnail', '--no-warnings': 'quiet',
+                 '--newline': 'newline'}
+
+    def __init__(self, common):
+        if youtube_dl is None:
+            raise ImportError(
+                "youtube_dl python module is required for 'embedded' engine")
+        super().__init__(common)
+        self._local = threading.local()
+
+    def _get_ydl(self, key, params):
+        """
+        Get (cached) YoutubeDL instance of current thread for key
+        """
+        if not hasattr(self._local, 'instances'):
+            self._local.instances = {}
+        if key not in self._local.instances:
+            self._local.instances[key] = youtube_dl.YoutubeDL(params)
+        return self._local.instances[key]
+
+    @staticmethod
+    def parse_info_command(command, flags=('--flat-playlist', '-J')):
+        """
+        Get URL from playlist info command. Returns None if command has
+        arguments other than flags and URL.
+        """
+        try:
+            tokens = shlex.split(command)
+        except ValueError:
+            return None
+        if len(tokens) != len(flags) + 2 or set(tokens[1:-1]) != set(flags):
+            return None
+        return tokens[-1]
+
+    @classmethod
+    def parse_download_command(cls, command):
+        """
+        Parse download command into options dict. Returns None if command has
+        arguments that are not understood by embedded engine.
+        """
+        try:
+            tokens = shlex.split(command)
+        except ValueError:
+            return None
+        options = {'urls': []}
+        index = 1
+        while index < len(tokens):
+            token = tokens[index]
+            if token in ('-a', '--batch-file') and index + 1 < len(tokens):
+                _urls = cls.read_batch_file(tokens[index + 1])
+                if _urls is None:
+                    return None
+                options['urls'].extend(_urls)
+                index = index + 2
+                continue
+            if token in cls.VALUE_ARGS and index + 1 < len(tokens):
+                options[cls.VALUE_ARGS[token]] = tokens[index + 1]
+                index = index + 2
+                continue
+            if token in cls.FLAG_ARGS:
+                options[cls.FLAG_ARGS[token]] = True
+            elif not token.startswith('-'):
+                options['urls'].append(token)
+            else:
+                return None
+            index = index + 1
+        if not options.get('extract_audio') or 'output' not in options:
+            return None
+        if options.get('exec', DONE_COMMAND) != DONE_COMMAND:
+            # Commands run after download are not supported
+            return None
+        return options
+
+    @staticmethod
+    def read_batch_file(path):
+        """
+        Read URL(s) of youtube-dl batch file (-a). Blank and comment lines are skipped.
+        Returns None if batch file can't be read (or is stdin).
+        """
+        if path == '-':
+            return None
+        try:
+            with open(path) as batch_file:
+                return [x.strip() for x in batch_file
+                        if x.strip() and not x.strip().startswith(('#', ';', ']'))]
+        except OSError:
+            return None
+
+    def fetch_info(self, command):
+        url = self.parse_info_command(command)
+        if url is None:
+            return super().fetch_info(command)
+        ydl = self._get_ydl('info', {'extract_flat': 'in_playlist', 'quiet': True,
+                                     'no_warnings': True, 'skip_download': True})
+        try:
+            return ydl.extract_info(url, download=False)
+        except youtube_dl.utils.DownloadError as ex:
+            raise ValueError(str(ex))
+
+    def stream_info(self, stream_command, title_command):
+        url = self.parse_info_command(
+            stream_command, ('--flat-playlist', '--dump-json'))
+        if url is None:
+            return super().stream_info(stream_command, title_command)
+        ydl = self._get_ydl('info', {'extract_flat': 'in_playlist', 'quiet': True,
+                                     'no_warnings': True, 'skip_download': True})
+        try:
+            # Unprocessed result: playlist entries are fetched lazily (page by page)
+            result = ydl.extract_info(url, download=False, process=False)
+            if result.get('_type') in ('url', 'url_transparent'):
+                result = ydl.extract_info(url, download=False)
+        except youtube_dl.utils.DownloadError as ex:
+            raise ValueError(str(ex))
+        if result.get('_type') != 'playlist':
+            return result
+        entries = result.get('entries') or []
+        if hasattr(entries, 'getslice'):
+            entries = self._paged_entries(entries)
+        return {'title': result.get('title'), 'id': result.get('id'),
+                'entries': (x for x in entries if x)}
+
+    @staticmethod
+    def _paged_entries(paged_list):
+        """
+        Yield entries of youtube_dl PagedList, fetching one page at a time
+        (getslice() without range fetches all pages first)
+        """
+        page_size = getattr(paged_list, '_pagesize', None) or 50
+        start = 0
+        while True:
+            page = paged_list.getslice(start, start + page_size)
+            for entry in page:
+                yield entry
+            if len(page) < page_size:
+                return
+            start = start + page_size
+
+    def download(self, command):
+        options = self.parse_download_command(command)
+        if options is None:
+            return super().download(command)
+        return self._download(options)
+
+    def _progress_hook(self, status):
+        """
+        Report YoutubeDL download progress to dashboard (if enabled)
+        """
+        dashboard = self.common.dashboard
+        if dashboard and dashboard.current_worker() is not None and \
+                status.get('status') == 'downloading':
+            dashboard.update(dashboard.current_worker(), status.get('downloaded_bytes') or 0,
+                             status.get('total_bytes') or status.get('total_bytes_estimate') or 0,
+                             status.get('speed') or 0)
+
+    def _download(self, options):
+        postprocessors = [{'key': 'FFmpegExtractAudio',
+                           'preferredcodec': options.get('audio_format', 'best'),
+                           'preferredquality': options.get('audio_quality', '5'),
+                           'nopostoverwrites': False}]
+        if options.get('add_metadata'):
+            postprocessors.append({'key': 'FFmpegMetadata'})
+        if options.get('embed_thumbnail'):
+            postprocessors.append(
+                {'key': 'EmbedThumbnail', 'already_have_thumbnail': False})
+        key = ('download', options.get('audio_format'), options.get('audio_quality'),
+               bool(options.get('add_metadata')), bool(options.get('embed_thumbnail')))
+        ydl = self._get_ydl(key, {'format': 'bestaudio/best', 'quiet': True, 'no_warnings': True,
+                                  'noprogress': True, 'writethumbnail': bool(options.get('embed_thumbnail')),
+                                  'postprocessors': postprocessors,
+                                  'progress_hooks': [self._progress_hook]})
+        ydl.params['outtmpl'] = options['output']
+        ydl.params['download_archive'] = options.get('download_archive')
+
+        for url in options['urls']:
+            try:
+                info = ydl.extract_info(url, download=True)
+            except youtube_dl.utils.DownloadError as ex:
+                yield str(ex).encode('utf-8')
+                continue
+            if not info:
+                # Skipped (already in archive)
+                continue
+            yield json.dumps({'id': info.get('id'), 'title': info.get('title'),
+                              'extractor': info.get('extractor'),
+                              'webpage_url': info.get('webpage_url'),
+                              '_filename': info.get('_filename'),
+                              'filesize': info.get('filesize')}).encode('utf-8')
+            # Title is post-processed when extract_info() returns
+            yield DONE_MARKER.encode('utf-8')
+
+
+class AsyncioEngine(SubprocessEngine):
+    """
+    Runs youtube-dl commands as asyncio subprocesses on a single event loop.
+    stderr is read separately from stdout (warnings are logged, not parsed as
+    JSON), commands are killed on timeout, and parallel downloads/probes run
+    without a thread per process.
+    """
+
+    name = 'asyncio'
+
+    # Child watcher usable from event loop thread (see ProcessRunner)
+    MIN_PYTHON = (3, 8)
+
+    def __init__(self, common, max_processes=16):
+        if sys.version_info < self.MIN_PYTHON:
+            raise RuntimeError("Engine 'asyncio' requires Python {0}.{1} or newer\n".format(
+                *self.MIN_PYTHON))
+        super().__init__(common)
+        self.runner = ProcessRunner(max_processes)
+
+    def _log_stderr(self, line):
+        _message = line.decode('utf-8', 'replace').strip()
+        if not _message:
+            return
+        if _message.startswith('ERROR'):
+            self.common.log(_message, 'error')
+        else:
+            self.common.log(_message.replace('WARNING: ', ''), 'warning')
+
+    def fetch_info(self, command):
+        self.common.require_command(command)
+        returncode, stdout, stderr = self.runner.run(
+            command, timeout=self.command_timeout)
+        if not stdout.strip():
+            raise ValueError(stderr.decode('utf-8', 'replace').strip())
+        return json.loads(stdout)
+
+    def stream_info(self, stream_command, title_command):
+        self.common.require_command(stream_command)
+        # ERROR lines are read as well (reported if no entry is received)
+        lines = self._stdout_lines(self.runner.stream(
+            stream_command, idle_timeout=self.command_timeout), True)
+        first = self._first_entry(lines)
+        if first.get('_type') not in ('url', 'url_transparent'):
+            return first
+        title = first.get('playlist_title') or first.get('playlist')
+        if not title:
+            title = self.fetch_info(title_command)['title']
+        return {'title': title, 'entries': self._stream_entries(first, lines)}
+
+    def _stdout_lines(self, output, errors=False):
+        """
+        Yield stdout lines and log stderr lines. With errors=True, youtube-dl
+        ERROR lines are yielded as well (reported with download progress).
+        """
+        for stream, line in output:
+            if stream == 'stdout' or (errors and line.startswith(b'ERROR')):
+                yield line
+            else:
+                self._log_stderr(line)
+
+    def download(self, command):
+        self.common.require_command(command)
+        return self._stdout_lines(self.runner.stream(
+            command, True, idle_timeout=self.idle_timeout), True)
+
+    def download_many(self, commands, on_line):
+        """
+        Run download commands concurrently on event loop (blocking until all exit)
+
+        Parameters:
+        ==========
+        > commands (list): download commands
+
+        > on_line (function): on_line(line, index) called for every stdout (and stderr ERROR)
+        line with index of command
+        """
+        for command in commands:
+            self.common.require_command(command)
+
+        def _on_line(index, stream, line):
+            if stream == 'stdout' or line.startswith(b'ERROR'):
+                on_line(line, index)
+            else:
+                self._log_stderr(line)
+
+        for result in self.runner.run_many(commands, True, idle_timeout=self.idle_timeout,
+                                           on_line=_on_line):
+            if isinstance(result, Exception):
+                self.common.log(str(result), 'error')
+
+    def run_commands(self, commands, is_shell=True):
+        results = self.runner.run_many(
+            commands, is_shell, timeout=self.command_timeout)
+        return [x[1].decode('utf-8', 'replace') if not isinstance(x, Exception) else ''
+                for x in results]
+
+
+ENGINES = {SubprocessEngine.name: SubprocessEngine,
+           EmbeddedEngine.name: EmbeddedEngine,
+           AsyncioEngine.name: AsyncioEngine}
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path, PurePath
+
+
+class PlaylistInfoCache:
+    """
+    On-disk cache of URL (playlist/title) info keyed by URL.
+    Along with info, the entry id(s) seen on last sync are stored (snapshot),
+    which are used to report title(s) added/removed since last sync.
+    """
+
+    FILE_NAME = 'playlist-info.json'
+    VERSION = 1
+
+    def __init__(self, directory):
+        self.path = str(PurePath(directory, self.FILE_NAME))
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+            if data.get('version') == self.VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    @staticmethod
+    def compact(info):
+        """
+        Strip info to fields used by yt-audio
+        """
+        _info = {'title': info.get('title'), 'id': info.get('id')}
+        if 'entries' in info:
+            _info['entries'] = [{'id': x.get('id'), 'title': x.get('title')}
+                                for x in info['entries'] if x]
+        return _info
+
+    def get(self, url, ttl):
+        """
+        Get cached info for URL
+
+        Parameters:
+        ==========
+        > url (string): Video/Playlist URL
+
+        > ttl (int): Max. age of cached info (in seconds)
+
+        Returns:
+        =======
+        > (dict) URL info or None if not cached/expired
+        """
+        with self._lock:
+            entry = self.entries.get(url)
+        if not entry or ttl <= 0 or 'info' not in entry:
+            return None
+        if time.time() - entry.get('fetched', 0) > ttl:
+            return None
+        return entry['info']
+
+    def put(self, url, info):
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            entry['info'] = self.compact(info)
+            entry['fetched'] = time.time()
+            self._dirty = True
+
+    def diff(self, url, info):
+        """
+        Compare info's entry id(s) with snapshot of last sync and update snapshot
+
+        Returns:
+        =======
+        > (tuple) added entries (list), removed ids (list) or None if no snapshot exists
+        """
+        if 'entries' not in info:
+            return None
+        _entries = [x for x in info['entries'] if x]
+        _ids = [x['id'] for x in _entries]
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            snapshot = entry.get('snapshot')
+            entry['snapshot'] = _ids
+            self._dirty = True
+        if snapshot is None:
+            return None
+        _previous = set(snapshot)
+        _current = set(_ids)
+        added = [x for x in _entries if x['id'] not in _previous]
+        removed = [x for x in snapshot if x not in _current]
+        return added, removed
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            _temp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+            try:
+                with open(_temp_path, 'w') as cache_file:
+                    json.dump({'version': self.VERSION,
+                               'entries': self.entries}, cache_file)
+                os.replace(_temp_path, self.path)
+                self._dirty = False
+            except OSError:
+                try:
+                    os.remove(_temp_path)
+                except OSError:
+                    pass
@@ -0,0 +1,229 @@
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import PurePath
+
+from .locking import FileLock
+
+
+class SyncJournal:
+    """
+    Write-ahead journal of title download state, keyed by (playlist URL, video id).
+    Every state change is appended to journal file before/after it happens, so an
+    interrupted sync can be resumed and failed title(s) retried with exponential
+    backoff. Title(s) that fail max_attempts times are parked (skipped until
+    unparked). Finished ('done') title(s) are dropped when journal is compacted.
+    Records are stamped with owner (host:pid) of the sync writing them; only
+    title(s) of owners that are no longer running are resumed.
+
+    States: pending -> downloading -> done / failed -> (retry) ... -> parked
+    """
+
+    FILE_NAME = 'journal.jsonl'
+    UNFINISHED = ('pending', 'downloading')
+
+    # Compact journal file on load if it has more lines than this
+    COMPACT_LINES = 10000
+
+    def __init__(self, directory, backoff=300, max_backoff=86400, max_attempts=5, owner=None):
+        self.path = str(PurePath(directory, self.FILE_NAME))
+        self.owner = owner or '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def _key(playlist, video_id):
+        return '{0} {1}'.format(playlist, video_id)
+
+    def load(self):
+        """
+        Replay journal file (latest record of each title wins). Malformed
+        (e.g. partially written) lines are skipped.
+        """
+        self.entries = {}
+        _lines = 0
+        try:
+            with FileLock(self.path):
+                with open(self.path) as journal:
+                    for line in journal:
+                        _lines = _lines + 1
+                        try:
+                            record = json.loads(line)
+                            _key = self._key(record['playlist'], record['id'])
+                        except (ValueError, KeyError, TypeError):
+                            continue
+                        if record.get('state') == 'done':
+                            self.entries.pop(_key, None)
+                        else:
+                            self.entries[_key] = record
+                if _lines > self.COMPACT_LINES:
+                    self._rewrite()
+        except OSError:
+            pass
+
+    def _rewrite(self):
+        """
+        Rewrite journal file with current entries only (caller holds file lock)
+        """
+        _temp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(_temp_path, 'w') as journal:
+            for record in self.entries.values():
+                journal.write(json.dumps(record) + '\n')
+        os.replace(_temp_path, self.path)
+
+    def _append(self, records):
+        """
+        Apply records and append them to journal file (flushed to disk)
+        """
+        if not records:
+            return
+        with self._lock:
+            for record in records:
+                _key = self._key(record['playlist'], record['id'])
+                if record['state'] == 'done':
+                    self.entries.pop(_key, None)
+                else:
+                    self.entries[_key] = record
+            try:
+                with FileLock(self.path):
+                    with open(self.path, 'a') as journal:
+                        journal.write(''.join(json.dumps(x) + '\n' for x in records))
+                        journal.flush()
+                        os.fsync(journal.fileno())
+            except OSError:
+                pass
+
+    def get(self, playlist, video_id):
+        return self.entries.get(self._key(playlist, video_id))
+
+    def mark(self, playlist, titles, state, directory=None):
+        """
+        Record state of title(s)
+
+        Parameters:
+        ==========
+        > playlist (string): Playlist/Video URL
+
+        > titles (list): (video id, video URL (or None)) tuple(s)
+
+        > state (string): 'pending'/'downloading'/'done'
+
+        > directory (string)(optional): Save directory (required for resume)
+        """
+        _records = []
+        for video_id, url in titles:
+            record = dict(self.get(playlist, video_id) or {})
+            record.update({'playlist': playlist, 'id': video_id, 'state': state,
+                           'time': time.time(), 'owner': self.owner})
+            if url is not None:
+                record['url'] = url
+            if directory is not None:
+                record['directory'] = directory
+            _records.append(record)
+        self._append(_records)
+
+    def fail(self, playlist, video_id, reason):
+        """
+        Record failed download of title. Next retry is scheduled with exponential
+        backoff; title is parked after max_attempts failures.
+
+        Returns:
+        =======
+        > (dict) Journal record
+        """
+        record = dict(self.get(playlist, video_id) or {'playlist': playlist, 'id': video_id})
+        _attempts = record.get('attempts', 0) + 1
+        record.update({'attempts': _attempts, 'reason': reason, 'time': time.time()})
+        if _attempts >= self.max_attempts:
+            record['state'] = 'parked'
+        else:
+            record['state'] = 'failed'
+            record['retry'] = time.time() + min(
+                self.max_backoff, self.backoff * 2 ** (_attempts - 1))
+        self._append([record])
+        return record
+
+    def due(self, playlist, titles, now=None):
+        """
+        Filter out title(s) waiting for retry and parked title(s)
+
+        Parameters:
+        ==========
+        > playlist (string): Playlist/Video URL
+
+        > titles (list): (video id, video URL) tuple(s)
+
+        Returns:
+        =======
+        > (tuple) title(s) due (list), no. of titles waiting for retry, no. of titles parked
+        """
+        now = now or time.time()
+        _due, _waiting, _parked = [], 0, 0
+        for video_id, url in titles:
+            record = self.get(playlist, video_id)
+            if record and record['state'] == 'parked':
+                _parked = _parked + 1
+            elif record and record['state'] == 'failed' and record.get('retry', 0) > now:
+                _waiting = _waiting + 1
+            else:
+                _due.append((video_id, url))
+        return _due, _waiting, _parked
+
+    def unfinished(self, playlist):
+        """
+        Get title(s) of playlist whose download was interrupted (pending/downloading,
+        owner is not running). Title(s) of running syncs (e.g. another process
+        syncing same playlist) are not included.
+
+        Returns:
+        =======
+        > (list) journal records
+        """
+        return [x for x in list(self.entries.values())
+                if x['playlist'] == playlist and x['state'] in self.UNFINISHED and x.get('directory')
+                and not self.is_running(x.get('owner'))]
+
+    def is_running(self, owner):
+        """
+        Check if owner (host:pid[:...]) of a record is running. Owners on other
+        hosts (shared cache directory) are assumed to be running.
+        """
+        if not owner:
+            return False
+        if owner == self.owner:
+            return True
+        _parts = owner.split(':')
+        if _parts[0] != socket.gethostname():
+            return True
+        if os.name != 'posix' or len(_parts) < 2:
+            return False
+        try:
+            os.kill(int(_parts[1]), 0)
+        except ProcessLookupError:
+            return False
+        except (OSError, ValueError):
+            pass
+        return True
+
+    def unpark(self):
+        """
+        Reset parked title(s), so they are retried on next sync
+
+        Returns:
+        =======
+        > (int) no. of titles unparked
+        """
+        _records = []
+        for record in list(self.entries.values()):
+            if record['state'] == 'parked':
+                record = dict(record)
+                record.update({'state': 'failed', 'attempts': 0, 'retry': 0})
+                _records.append(record)
+        self._append(_records)
+        return len(_records)
@@ -0,0 +1,124 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import PurePath
+
+
+class LeaseQueue:
+    """
+    Work-lease queue shared by yt-audio processes/hosts syncing into the same
+    output directory (SQLite database in output directory). A title is only
+    downloaded by the process holding its lease (keyed by playlist and video id).
+    Leases are extended by a heartbeat thread while the owner is alive; expired
+    leases (owner crashed/stopped) can be claimed by other processes.
+
+    NOTE: SQLite relies on file locking of the filesystem (NFS requires working
+    lockd).
+    """
+
+    FILE_NAME = '.yt-audio-leases.db'
+
+    def __init__(self, directory, ttl=120, owner=None):
+        os.makedirs(directory, exist_ok=True)
+        self.path = str(PurePath(directory, self.FILE_NAME))
+        self.ttl = ttl
+        self.owner = owner or self.new_owner()
+        self._stop = threading.Event()
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS leases (playlist TEXT NOT NULL, '
+                               'video_id TEXT NOT NULL, owner TEXT NOT NULL, expires REAL NOT NULL, '
+                               'PRIMARY KEY (playlist, video_id))')
+        self._heartbeat = threading.Thread(
+            target=self._heartbeat_loop, name='yt-audio-lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    @staticmethod
+    def new_owner():
+        """
+        Get unique owner id of this process (host:pid:random)
+        """
+        return '{0}:{1}:{2}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+    def _connect(self):
+        # One connection per call: connections can't be shared between threads
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return _Transaction(connection)
+
+    def claim(self, playlist, video_ids):
+        """
+        Claim leases of title(s). Titles leased by another live owner are skipped.
+
+        Parameters:
+        ==========
+        > playlist (string): Playlist/Video URL
+
+        > video_ids (list): Video id(s)
+
+        Returns:
+        =======
+        > (set) Video id(s) claimed
+        """
+        _claimed = set()
+        now = time.time()
+        with self._connect() as connection:
+            for video_id in video_ids:
+                row = connection.execute('SELECT owner, expires FROM leases WHERE playlist = ? AND '
+                                         'video_id = ?', (playlist, video_id)).fetchone()
+                if row is not None and row[0] != self.owner and row[1] > now:
+                    continue
+                connection.execute('INSERT OR REPLACE INTO leases (playlist, video_id, owner, expires) '
+                                   'VALUES (?, ?, ?, ?)', (playlist, video_id, self.owner, now + self.ttl))
+                _claimed.add(video_id)
+        return _claimed
+
+    def release(self, playlist, video_ids):
+        """
+        Release leases of title(s) held by this owner
+        """
+        with self._connect() as connection:
+            connection.executemany('DELETE FROM leases WHERE playlist = ? AND video_id = ? AND owner = ?',
+                                   [(playlist, x, self.owner) for x in video_ids])
+
+    def heartbeat(self):
+        """
+        Extend all leases held by this owner and remove expired leases of other owners
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('UPDATE leases SET expires = ? WHERE owner = ?',
+                               (now + self.ttl, self.owner))
+            connection.execute('DELETE FROM leases WHERE expires < ?', (now,))
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(max(1, self.ttl / 3)):
+            try:
+                self.heartbeat()
+            except sqlite3.Error:
+                # Database busy/unavailable; retried on next heartbeat (lease expires after ttl)
+                pass
+
+    def close(self):
+        self._stop.set()
+
+
+class _Transaction:
+    """
+    Run statements of a connection in a single write transaction (BEGIN IMMEDIATE),
+    committed on exit (rolled back on error) and close connection
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.connection.close()
@@ -0,0 +1,69 @@
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Exclusive, blocking inter-process lock backed by a '<path>.lock' file.
+    Used as a context manager around writes to files shared between workers.
+    Lock file is removed on release (so save directories are not left with
+    lock files); a process that locked a removed lock file locks again.
+    """
+
+    def __init__(self, path):
+        self.lock_path = '{0}.lock'.format(path)
+        self._fd = None
+
+    def acquire(self):
+        _directory = os.path.dirname(self.lock_path)
+        if _directory:
+            os.makedirs(_directory, exist_ok=True)
+        while True:
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            if not fcntl:
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(self._fd), os.stat(self.lock_path)):
+                    return
+            except OSError:
+                pass
+            # Lock file was removed by previous holder while waiting for it
+            os.close(self._fd)
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl:
+                # Removed while locked: waiters notice and lock new file
+                try:
+                    os.remove(self.lock_path)
+                except OSError:
+                    pass
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+        if not fcntl:
+            # Fails while another process has lock file open
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,214 @@
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.request
+from pathlib import Path, PurePath
+
+
+class MediaCache:
+    """
+    Local cache of thumbnails and tag metadata of titles, keyed by (extractor, video id).
+    Used by transcoder, so re-downloads and titles in several playlists get
+    their thumbnail without another request. Cache size is limited
+    to max_size bytes (0: unlimited); least recently used entries are evicted
+    (file mtime is access time).
+
+    Layout: <directory>/<extractor>-<video id>.json and <extractor>-<video id>.<image ext>
+    """
+
+    IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp')
+
+    # info fields used for tagging (see Transcoder.metadata())
+    INFO_FIELDS = ('title', 'track', 'upload_date', 'description', 'webpage_url', 'track_number',
+                   'artist', 'creator', 'uploader', 'uploader_id', 'genre', 'album',
+                   'album_artist', 'disc_number', 'thumbnail')
+
+    # Max. thumbnail size fetched from network
+    MAX_THUMBNAIL_SIZE = 10 * 1024 * 1024
+
+    def __init__(self, directory, max_size=500 * 1024 * 1024, timeout=30):
+        self.directory = directory
+        self.max_size = max_size
+        self.timeout = timeout
+        self._index = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _name(key):
+        return '{0}-{1}'.format(*key)
+
+    def _load_index(self):
+        """
+        Index cache files (name: (size, mtime)), built on first use (caller holds lock)
+        """
+        if self._index is not None:
+            return
+        self._index = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        _stat = entry.stat()
+                        self._index[entry.name] = (_stat.st_size, _stat.st_mtime)
+        except OSError:
+            pass
+
+    def _touch(self, name):
+        """
+        Mark cache file used (LRU). Returns path or None if file is missing.
+        """
+        _path = str(PurePath(self.directory, name))
+        try:
+            os.utime(_path)
+        except OSError:
+            with self._lock:
+                self._load_index()
+                self._index.pop(name, None)
+            return None
+        with self._lock:
+            self._load_index()
+            if name in self._index:
+                self._index[name] = (self._index[name][0], time.time())
+        return _path
+
+    def _store(self, name, write):
+        """
+        Write cache file atomically (write(file) writes content) and evict
+        least recently used files if cache is over max. size
+
+        Returns:
+        =======
+        > (string) Cache file path
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        _path = str(PurePath(self.directory, name))
+        _temp_path = '{0}.{1}.{2}.tmp'.format(_path, os.getpid(), threading.get_ident())
+        try:
+            with open(_temp_path, 'wb') as cache_file:
+                write(cache_file)
+            os.replace(_temp_path, _path)
+        finally:
+            if os.path.exists(_temp_path):
+                os.remove(_temp_path)
+        _stat = os.stat(_path)
+        with self._lock:
+            self._load_index()
+            self._index[name] = (_stat.st_size, _stat.st_mtime)
+            self._evict(keep=name)
+        return _path
+
+    def _evict(self, keep=None):
+        """
+        Remove least recently used files until cache fits max. size (caller holds lock)
+        """
+        if not self.max_size:
+            return
+        _total = sum(x[0] for x in self._index.values())
+        if _total <= self.max_size:
+            return
+        for name, (size, _) in sorted(self._index.items(), key=lambda x: x[1][1]):
+            if _total <= self.max_size:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(str(PurePath(self.directory, name)))
+            except OSError:
+                pass
+            del self._index[name]
+            _total = _total - size
+
+    def get_thumbnail(self, key):
+        """
+        Get cached thumbnail of title
+
+        Parameters:
+        ==========
+        > key (tuple): (extractor, video id)
+
+        Returns:
+        =======
+        > (string) Thumbnail path or None
+        """
+        for suffix in self.IMAGE_SUFFIXES:
+            _path = self._touch(self._name(key) + suffix)
+            if _path:
+                return _path
+        return None
+
+    def put_thumbnail(self, key, source):
+        """
+        Add thumbnail file to cache (source file is kept)
+
+        Returns:
+        =======
+        > (string) Cached thumbnail path
+        """
+        _suffix = Path(source).suffix.lower()
+        if _suffix not in self.IMAGE_SUFFIXES:
+            _suffix = '.jpg'
+
+        def _write(cache_file):
+            with open(source, 'rb') as source_file:
+                shutil.copyfileobj(source_file, cache_file)
+        return self._store(self._name(key) + _suffix, _write)
+
+    def fetch_thumbnail(self, key, url):
+        """
+        Get thumbnail of title from cache, downloading it into cache from url on miss
+
+        Returns:
+        =======
+        > (string) Thumbnail path or None (not cached and download failed)
+        """
+        _path = self.get_thumbnail(key)
+        if _path or not url:
+            return _path
+        _suffix = Path(url.split('?')[0]).suffix.lower()
+        if _suffix not in self.IMAGE_SUFFIXES:
+            _suffix = '.jpg'
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                _data = response.read(self.MAX_THUMBNAIL_SIZE + 1)
+        except (OSError, ValueError):
+            return None
+        if not _data or len(_data) > self.MAX_THUMBNAIL_SIZE:
+            return None
+        return self._store(self._name(key) + _suffix, lambda x: x.write(_data))
+
+    def get_info(self, key):
+        """
+        Get cached metadata of title (dict) or None
+        """
+        _path = self._touch(self._name(key) + '.json')
+        if not _path:
+            return None
+        try:
+            with open(_path) as info_file:
+                return json.load(info_file)
+        except (OSError, ValueError):
+            return None
+
+    def merge_info(self, key, info):
+        """
+        Merge title info with cached metadata: fields missing in info are taken
+        from cache, cache is updated with fields of info
+
+        Returns:
+        =======
+        > (dict) Merged info
+        """
+        _cached = self.get_info(key) or {}
+        _fields = {x: info[x] for x in self.INFO_FIELDS if info.get(x) is not None}
+        _merged = dict(_cached)
+        _merged.update(_fields)
+        if _merged != _cached:
+            _data = json.dumps(_merged).encode('utf-8')
+            self._store(self._name(key) + '.json', lambda x: x.write(_data))
+        _info = dict(info)
+        for field, value in _merged.items():
+            if _info.get(field) is None:
+                _info[field] = value
+        return _info
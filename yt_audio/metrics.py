@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Metrics:
+    """
+    Collects wall time, item counts and bytes per phase (info, filter, download, transcode, ...)
+    and per playlist. Results can be written as JSON report or as Prometheus
+    textfile-collector file.
+    """
+
+    FORMATS = ('json', 'prometheus')
+    FIELDS = ('seconds', 'runs', 'items', 'bytes', 'failed', 'probes')
+
+    def __init__(self):
+        self.started = time.time()
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, playlist='', **values):
+        """
+        Add values to phase counters
+
+        Parameters:
+        ==========
+        > phase (string): Phase name
+
+        > playlist (string)(optional): Playlist/URL the values belong to
+
+        > values: Counter increments (seconds/runs/items/bytes/failed/probes)
+        """
+        with self._lock:
+            counters = self._phases.setdefault(
+                (phase, playlist or ''), dict.fromkeys(self.FIELDS, 0))
+            for key, value in values.items():
+                counters[key] = counters.get(key, 0) + (value or 0)
+
+    @contextmanager
+    def phase(self, phase, playlist=''):
+        """
+        Time phase (context manager). Yields dict; values set in it are added
+        to phase counters when phase ends.
+        """
+        values = {}
+        start = time.perf_counter()
+        try:
+            yield values
+        finally:
+            self.add(phase, playlist, seconds=time.perf_counter() - start,
+                     runs=1, **values)
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(phase=phase, playlist=playlist, **counters)
+                    for (phase, playlist), counters in sorted(self._phases.items())]
+
+    def totals(self, phases):
+        _totals = {}
+        for entry in phases:
+            counters = _totals.setdefault(
+                entry['phase'], dict.fromkeys(self.FIELDS, 0))
+            for key in self.FIELDS:
+                counters[key] = counters[key] + entry[key]
+        return _totals
+
+    def to_json(self):
+        phases = self.snapshot()
+        return json.dumps({'started': self.started, 'updated': time.time(),
+                           'phases': phases, 'totals': self.totals(phases)}, indent=2)
+
+    @staticmethod
+    def _label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def to_prometheus(self):
+        phases = self.snapshot()
+        lines = []
+        for field in self.FIELDS:
+            name = 'yt_audio_phase_{0}'.format(
+                field if field != 'seconds' else 'duration_seconds')
+            lines.append('# HELP {0} yt-audio {1} per phase and playlist'.format(
+                name, field))
+            lines.append('# TYPE {0} gauge'.format(name))
+            for entry in phases:
+                lines.append('{0}{{phase="{1}",playlist="{2}"}} {3}'.format(
+                    name, self._label(entry['phase']), self._label(entry['playlist']), entry[field]))
+        lines.append('# HELP yt_audio_last_update_timestamp_seconds Time metrics were written')
+        lines.append('# TYPE yt_audio_last_update_timestamp_seconds gauge')
+        lines.append('yt_audio_last_update_timestamp_seconds {0}'.format(time.time()))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, metrics_format='json'):
+        """
+        Write metrics file (atomically)
+
+        Parameters:
+        ==========
+        > path (string): Metrics file path
+
+        > metrics_format (string): 'json' or 'prometheus'
+        """
+        data = self.to_prometheus() if metrics_format == 'prometheus' else self.to_json()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        _temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(_temp_path, 'w') as metrics_file:
+            metrics_file.write(data)
+        os.replace(_temp_path, path)
@@ -0,0 +1,85 @@
+import json
+import os
+from pathlib import PurePath
+
+
+class ProbeCache:
+    """
+    Persistent per-directory cache of file metadata URL(s) (purl).
+    Entries are keyed by file name and validated against file size and mtime,
+    so only new/changed files need to be probed again.
+    """
+
+    FILE_NAME = '.yt-audio-probe-cache.json'
+    VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = str(PurePath(directory, self.FILE_NAME))
+        self.entries = {}
+        self._seen = set()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Load cache file. A missing/corrupt cache file results in empty cache.
+        """
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+            if data.get('version') == self.VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def get(self, name, stat):
+        """
+        Get cached URL for file
+
+        Parameters:
+        ==========
+        > name (string): File name (relative to cache directory)
+
+        > stat (os.stat_result): File stat
+
+        Returns:
+        =======
+        > (tuple) cache hit (bool), URL (string/None)
+        """
+        self._seen.add(name)
+        entry = self.entries.get(name)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return True, entry['purl']
+        return False, None
+
+    def set(self, name, stat, purl):
+        """
+        Cache URL (or None, for files without purl) for file
+        """
+        self._seen.add(name)
+        self.entries[name] = {'size': stat.st_size,
+                              'mtime': stat.st_mtime_ns, 'purl': purl}
+        self._dirty = True
+
+    def save(self):
+        """
+        Drop entries for files that were not seen (deleted) and write cache file
+        """
+        for name in [x for x in self.entries if x not in self._seen]:
+            del self.entries[name]
+            self._dirty = True
+        if not self._dirty:
+            return
+        _temp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(_temp_path, 'w') as cache_file:
+                json.dump({'version': self.VERSION,
+                           'entries': self.entries}, cache_file)
+            os.replace(_temp_path, self.path)
+            self._dirty = False
+        except OSError:
+            try:
+                os.remove(_temp_path)
+            except OSError:
+                pass
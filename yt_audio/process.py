@@ -0,0 +1,201 @@
+import asyncio
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import threading
+
+
+class CommandTimeout(Exception):
+    """
+    Raised when a command exceeds its timeout (command is killed)
+    """
+    pass
+
+
+class ProcessRunner:
+    """
+    Runs commands as asyncio subprocesses on a single event loop (running in a
+    background thread). stdout and stderr are read concurrently into separate
+    streams; each command can have a total timeout and an idle timeout (no output
+    for given seconds), after which it is killed. At most max_processes commands
+    run at a time.
+
+    Requires Python >= 3.8 on Unix (child watcher usable from any thread).
+    """
+
+    # Run each command in its own process group, so it can be killed with its children
+    SESSION = {'start_new_session': True} if hasattr(os, 'killpg') else {}
+
+    # Max. line length read from command output (-J output of large playlists is a single line)
+    LINE_LIMIT = 2 ** 28
+
+    def __init__(self, max_processes=16):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='yt-audio-process-loop', daemon=True)
+        self._thread.start()
+        self._semaphore = self.submit(
+            self._create_semaphore(max_processes)).result()
+
+    @staticmethod
+    def _kill(process):
+        """
+        Kill process and (on Unix) its child processes (e.g. command run by shell)
+        """
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    async def _create_semaphore(value):
+        return asyncio.Semaphore(value)
+
+    def submit(self, coroutine):
+        """
+        Schedule coroutine on event loop. Returns concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def run_async(self, command, shell=False, on_line=None, timeout=None, idle_timeout=None):
+        """
+        Run command and wait for it to exit
+
+        Parameters:
+        ==========
+        > command (string): Command to execute
+
+        > shell (bool): Run command through shell
+
+        > on_line (function)(optional): on_line(stream, line) called for every
+        output line ('stdout'/'stderr', bytes). If not given, output is collected.
+
+        > timeout (float)(optional): Max. seconds command may run
+
+        > idle_timeout (float)(optional): Max. seconds without any output
+
+        Returns:
+        =======
+        > (tuple) return code, stdout (bytes), stderr (bytes)
+        (stdout/stderr are empty if on_line is given)
+
+        Raises:
+        ======
+        > CommandTimeout: command timed out (and was killed)
+        """
+        output = {'stdout': [], 'stderr': []}
+        if on_line is None:
+            def on_line(stream, line):
+                output[stream].append(line)
+
+        async with self._semaphore:
+            if shell:
+                process = await asyncio.create_subprocess_shell(
+                    command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, limit=self.LINE_LIMIT, **self.SESSION)
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    *shlex.split(command), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, limit=self.LINE_LIMIT, **self.SESSION)
+            loop = asyncio.get_event_loop()
+            activity = {'last': loop.time()}
+
+            async def _pump(stream, name):
+                while True:
+                    line = await stream.readline()
+                    if not line:
+                        break
+                    activity['last'] = loop.time()
+                    on_line(name, line)
+
+            task = asyncio.ensure_future(asyncio.gather(
+                _pump(process.stdout, 'stdout'), _pump(process.stderr, 'stderr'), process.wait()))
+            started = loop.time()
+            try:
+                while not task.done():
+                    _wait = None
+                    if timeout:
+                        _wait = timeout - (loop.time() - started)
+                    if idle_timeout:
+                        _idle = idle_timeout - (loop.time() - activity['last'])
+                        _wait = _idle if _wait is None else min(_wait, _idle)
+                    if _wait is not None and _wait <= 0:
+                        raise CommandTimeout('Command timed out: {0}'.format(
+                            command.split(' ')[0]))
+                    await asyncio.wait([task], timeout=_wait)
+                task.result()
+            except (CommandTimeout, asyncio.CancelledError):
+                self._kill(process)
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                await process.wait()
+                raise
+        return process.returncode, b''.join(output['stdout']), b''.join(output['stderr'])
+
+    def run(self, command, shell=False, timeout=None, idle_timeout=None):
+        """
+        Run command (blocking). See run_async().
+        """
+        return self.submit(self.run_async(command, shell, None, timeout, idle_timeout)).result()
+
+    def run_many(self, commands, shell=False, timeout=None, idle_timeout=None, on_line=None):
+        """
+        Run commands concurrently on event loop (blocking until all exit)
+
+        Parameters:
+        ==========
+        > commands (list): Commands to execute
+
+        > on_line (function)(optional): on_line(index, stream, line) for output of command[index]
+
+        Returns:
+        =======
+        > (list) run_async() result or exception for each command
+        """
+        async def _run_all():
+            coroutines = []
+            for index, command in enumerate(commands):
+                _on_line = None
+                if on_line is not None:
+                    _on_line = (lambda i: lambda stream, line: on_line(i, stream, line))(index)
+                coroutines.append(self.run_async(
+                    command, shell, _on_line, timeout, idle_timeout))
+            return await asyncio.gather(*coroutines, return_exceptions=True)
+        return self.submit(_run_all()).result()
+
+    def stream(self, command, shell=False, timeout=None, idle_timeout=None):
+        """
+        Run command, yielding output lines as they arrive (blocking generator)
+
+        Returns:
+        =======
+        > (yield) ('stdout'/'stderr', line (bytes)) tuple(s)
+
+        Raises:
+        ======
+        > CommandTimeout: command timed out (and was killed)
+        """
+        lines = queue.Queue()
+        _done = object()
+        future = self.submit(self.run_async(
+            command, shell, lambda stream, line: lines.put((stream, line)), timeout, idle_timeout))
+        future.add_done_callback(lambda _: lines.put(_done))
+        try:
+            while True:
+                item = lines.get()
+                if item is _done:
+                    break
+                yield item
+            future.result()
+        finally:
+            if not future.done():
+                # Generator closed early: kill command
+                future.cancel()
@@ -0,0 +1,170 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second (up to `burst` tokens).
+    Consuming more tokens than available is allowed (bucket goes into debt),
+    later consumers wait until debt is paid off. rate = 0 means unlimited.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def configure(self, rate, burst=None):
+        """
+        Change rate/burst, keeping tokens (or debt) of bucket
+        """
+        if self.rate:
+            self._refill()
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = min(self.tokens, self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self):
+        """
+        Seconds until a token is available (0 if available now)
+        """
+        if not self.rate:
+            return 0
+        self._refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, tokens):
+        if not self.rate:
+            return
+        self._refill()
+        self.tokens = self.tokens - tokens
+
+
+class RateLimiter:
+    """
+    Scheduler shared by all playlist info and download workers. Every youtube-dl
+    request (info fetch, download batch) takes a slot:
+
+    - request/byte token buckets limit requests and downloaded bytes per second
+    - no. of concurrent slots is adapted (AIMD): halved when server throttles
+      (HTTP 429) and new slots are held back for `pause` seconds (doubled on
+      repeated throttling), increased by one after a run of `limit` successful
+      downloads, up to max_concurrency.
+    """
+
+    THROTTLE_PATTERNS = ('HTTP Error 429', 'Too Many Requests')
+
+    def __init__(self, request_rate=0, byte_rate=0, max_concurrency=4, pause=30, max_pause=600):
+        self.requests = TokenBucket(request_rate)
+        self.bytes = TokenBucket(byte_rate)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.active = 0
+        self.pause = pause
+        self.max_pause = max_pause
+        self.throttles = 0
+        self._pause = pause
+        self._paused_until = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def configure(self, request_rate=0, byte_rate=0, max_concurrency=4, pause=30):
+        """
+        Change limits without resetting state (adapted concurrency, throttle
+        pause, token debt), e.g. when config is reloaded
+        """
+        with self._condition:
+            self.requests.configure(request_rate)
+            self.bytes.configure(byte_rate)
+            self.max_concurrency = max(1, max_concurrency)
+            self.limit = min(self.limit, self.max_concurrency)
+            self.pause = pause
+            self._pause = min(max(self._pause, pause), self.max_pause)
+            self._condition.notify_all()
+
+    @classmethod
+    def is_throttled(cls, message):
+        """
+        Check if youtube-dl output/error message reports throttling
+        """
+        return any(x in message for x in cls.THROTTLE_PATTERNS)
+
+    def acquire(self, requests=1):
+        """
+        Wait for free slot (and request tokens) and take it
+        """
+        with self._condition:
+            while True:
+                _wait = max(self._paused_until - time.monotonic(),
+                            self.requests.wait_time(), self.bytes.wait_time())
+                if _wait <= 0 and self.active < self.limit:
+                    self.active = self.active + 1
+                    self.requests.consume(requests)
+                    return
+                self._condition.wait(_wait if _wait > 0 else None)
+
+    def release(self):
+        with self._condition:
+            self.active = self.active - 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, requests=1):
+        """
+        Hold a slot while running a request (context manager)
+
+        Parameters:
+        ==========
+        > requests (int)(optional): no. of request tokens taken (e.g. no. of titles in batch)
+        """
+        self.acquire(requests)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def success(self, downloaded_bytes=0, requests=0):
+        """
+        Report successful request. Downloaded bytes (and request tokens, for
+        requests not charged on acquire) are charged to token buckets.
+        """
+        with self._condition:
+            self.bytes.consume(downloaded_bytes)
+            self.requests.consume(requests)
+            self._successes = self._successes + 1
+            if self._successes >= self.limit:
+                self._successes = 0
+                self._pause = self.pause
+                if self.limit < self.max_concurrency:
+                    self.limit = self.limit + 1
+                    self._condition.notify_all()
+
+    def throttled(self):
+        """
+        Report throttling. Concurrency is halved at most once per pause period
+        (requests already running when throttling started report it too).
+
+        Returns:
+        =======
+        > (bool) True if concurrency was reduced
+        """
+        with self._condition:
+            self.throttles = self.throttles + 1
+            self._successes = 0
+            now = time.monotonic()
+            if now < self._paused_until:
+                return False
+            self.limit = max(1, self.limit // 2)
+            self._paused_until = now + self._pause
+            self._pause = min(self.max_pause, self._pause * 2)
+            return True
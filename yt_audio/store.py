@@ -0,0 +1,183 @@
+import errno
+import os
+import shutil
+from pathlib import Path, PurePath
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux FICLONE ioctl (reflink/copy-on-write clone, btrfs/xfs)
+FICLONE = 0x40049409
+
+
+class AudioStore:
+    """
+    Global content-addressed store of downloaded audio, keyed by (extractor, video id).
+    A title is downloaded once; playlist directories get a hardlink, reflink or
+    copy of stored file (whichever filesystem supports, see LINK_MODES).
+
+    Layout: <store>/<extractor>/<video id>/<file name>
+    """
+
+    LINK_MODES = ('auto', 'hardlink', 'reflink', 'copy')
+
+    # Files left next to downloaded title that are not audio
+    IGNORED_SUFFIXES = ('.part', '.ytdl', '.tmp', '.temp', '.jpg', '.jpeg', '.png', '.webp')
+
+    def __init__(self, path, link_mode='auto'):
+        if link_mode not in self.LINK_MODES:
+            raise ValueError("Unknown audio store link mode '{0}'. Available modes: {1}".format(
+                link_mode, ', '.join(self.LINK_MODES)))
+        self.path = path
+        self.link_mode = link_mode
+
+    def _title_directory(self, key):
+        return Path(self.path, key[0], key[1])
+
+    def get(self, key):
+        """
+        Get stored file of title
+
+        Parameters:
+        ==========
+        > key (tuple): (extractor, video id)
+
+        Returns:
+        =======
+        > (string) Stored file path or None
+        """
+        try:
+            for entry in self._title_directory(key).iterdir():
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    return str(entry)
+        except OSError:
+            pass
+        return None
+
+    def add(self, key, source):
+        """
+        Add downloaded file to store (no-op if title is already stored)
+
+        Parameters:
+        ==========
+        > key (tuple): (extractor, video id)
+
+        > source (string): Downloaded file path
+
+        Returns:
+        =======
+        > (string) Stored file path
+        """
+        stored = self.get(key)
+        if stored:
+            return stored
+        directory = self._title_directory(key)
+        directory.mkdir(parents=True, exist_ok=True)
+        stored = str(PurePath(directory, os.path.basename(source)))
+        _temp_path = '{0}.{1}.tmp'.format(stored, os.getpid())
+        try:
+            self.link(source, _temp_path)
+            os.replace(_temp_path, stored)
+        finally:
+            if os.path.lexists(_temp_path):
+                os.remove(_temp_path)
+        return stored
+
+    def place(self, key, directory):
+        """
+        Place stored file of title into directory
+
+        Parameters:
+        ==========
+        > key (tuple): (extractor, video id)
+
+        > directory (string): Destination directory
+
+        Returns:
+        =======
+        > (string) Placed file path or None if title is not stored
+        """
+        stored = self.get(key)
+        if not stored:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        destination = str(PurePath(directory, os.path.basename(stored)))
+        if not os.path.exists(destination):
+            _temp_path = '{0}.{1}.tmp'.format(destination, os.getpid())
+            try:
+                self.link(stored, _temp_path)
+                os.replace(_temp_path, destination)
+            finally:
+                if os.path.lexists(_temp_path):
+                    os.remove(_temp_path)
+        return destination
+
+    def link(self, source, destination):
+        """
+        Link/copy source to destination according to link mode. 'auto' tries
+        hardlink, then reflink and falls back to copy.
+        """
+        if self.link_mode in ('auto', 'hardlink'):
+            try:
+                os.link(source, destination)
+                return 'hardlink'
+            except OSError:
+                if self.link_mode == 'hardlink':
+                    raise
+        if self.link_mode in ('auto', 'reflink'):
+            try:
+                self.reflink(source, destination)
+                return 'reflink'
+            except OSError:
+                if self.link_mode == 'reflink':
+                    raise
+        shutil.copy2(source, destination)
+        return 'copy'
+
+    @staticmethod
+    def reflink(source, destination):
+        """
+        Clone source to destination (copy-on-write). Raises OSError if not supported.
+        """
+        if fcntl is None or not hasattr(fcntl, 'ioctl'):
+            raise OSError(errno.EOPNOTSUPP, 'Reflink not supported')
+        with open(source, 'rb') as src:
+            with open(destination, 'wb') as dst:
+                try:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                except OSError:
+                    dst.close()
+                    os.remove(destination)
+                    raise
+        shutil.copystat(source, destination)
+
+    @classmethod
+    def find_download(cls, info):
+        """
+        Get path of downloaded (post-processed) file from youtube-dl --print-json info
+        ('filepath' is set once youtube-dl reported title done). youtube-dl reports
+        file name before audio extraction, so file with same name and another
+        extension is searched for if it does not exist.
+
+        Returns:
+        =======
+        > (string) File path or None
+        """
+        if info.get('filepath') and os.path.isfile(info['filepath']):
+            return info['filepath']
+        _filename = info.get('_filename')
+        if not _filename:
+            return None
+        if os.path.isfile(_filename):
+            return _filename
+        _path = Path(_filename)
+        try:
+            for entry in _path.parent.iterdir():
+                if entry.stem == _path.stem and entry.suffix.lower() not in cls.IGNORED_SUFFIXES \
+                        and entry.is_file():
+                    return str(entry)
+        except OSError:
+            pass
+        return None
@@ -0,0 +1,260 @@
+import mmap
+import struct
+
+PURL_KEY = 'purl'
+
+
+class UnsupportedFormat(Exception):
+    """
+    Raised when file's container is not supported by the built-in tag reader
+    (or it could not be parsed). Callers should fall back to ffprobe.
+    """
+    pass
+
+
+def read_purl(path):
+    """
+    Read 'purl' tag from audio file without spawning a process.
+    Supported containers: ID3v2 (mp3), MP4/M4A atoms, Ogg Vorbis/Opus comments.
+    Only header bytes are touched (file is memory-mapped).
+
+    Parameters:
+    ==========
+    > path (string): Absolute file path
+
+    Returns:
+    =======
+    > (string) URL or None (if file has no purl tag)
+
+    Raises:
+    ======
+    > UnsupportedFormat: file format not supported by reader
+    """
+    try:
+        with open(path, 'rb') as audio_file:
+            with mmap.mmap(audio_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:3] == b'ID3':
+                    return _read_id3(data)
+                if data[:4] == b'OggS':
+                    return _read_ogg(data)
+                if data[4:8] == b'ftyp':
+                    return _read_mp4(data)
+    except UnsupportedFormat:
+        raise
+    except (OSError, ValueError, IndexError, struct.error, UnicodeDecodeError) as ex:
+        raise UnsupportedFormat(str(ex))
+    raise UnsupportedFormat(path)
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(encoding, data):
+    """
+    Decode ID3 text according to encoding byte, returning list of null-separated strings
+    """
+    if encoding == 0:
+        return data.decode('latin-1').split('\x00')
+    if encoding == 1:
+        return [x.lstrip('\ufeff') for x in data.decode('utf-16').split('\x00')]
+    if encoding == 2:
+        return data.decode('utf-16-be').split('\x00')
+    return data.decode('utf-8').split('\x00')
+
+
+def _read_id3(data):
+    version = data[3]
+    flags = data[5]
+    size = _syncsafe(data[6:10])
+    # Frames are read from data (memory-mapped file) in place, only frame
+    # headers and TXXX bodies are copied (not e.g. embedded cover art)
+    start, end = 10, min(10 + size, len(data))
+    if version < 4 and flags & 0x80:
+        # Whole tag is unsynchronised: frames can only be read from decoded copy
+        data = data[start:end].replace(b'\xff\x00', b'\xff')
+        start, end = 0, len(data)
+
+    offset = start
+    if flags & 0x40:
+        # Extended header
+        if version == 4:
+            offset = start + _syncsafe(data[start:start + 4])
+        elif version == 3:
+            offset = start + struct.unpack('>I', data[start:start + 4])[0] + 4
+
+    if version == 2:
+        header_size, frame_id, id_size = 6, 'TXX', 3
+    else:
+        header_size, frame_id, id_size = 10, 'TXXX', 4
+
+    while offset + header_size <= end:
+        _id = data[offset:offset + id_size]
+        if not _id.strip(b'\x00'):
+            break
+        if version == 2:
+            frame_size = int.from_bytes(data[offset + 3:offset + 6], 'big')
+            frame_flags = 0
+        elif version == 4:
+            frame_size = _syncsafe(data[offset + 4:offset + 8])
+            frame_flags = struct.unpack('>H', data[offset + 8:offset + 10])[0]
+        else:
+            frame_size = struct.unpack('>I', data[offset + 4:offset + 8])[0]
+            frame_flags = 0
+        _body_start = offset + header_size
+        offset = _body_start + frame_size
+
+        if _id.decode('latin-1') != frame_id:
+            continue
+        body = data[_body_start:min(offset, end)]
+        if not body:
+            continue
+        if version == 4:
+            if frame_flags & 0x0001:
+                # Data length indicator
+                body = body[4:]
+            if frame_flags & 0x0002:
+                body = body.replace(b'\xff\x00', b'\xff')
+        values = _decode_text(body[0], body[1:])
+        if len(values) > 1 and values[0].lower() == PURL_KEY:
+            return values[1] or None
+    return None
+
+
+def _atoms(data, start, end):
+    """
+    Yield (type, body start, body end) for MP4 atoms in data[start:end]
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            break
+        yield kind, offset + header, min(offset + size, end)
+        offset = offset + size
+
+
+def _find_atom(data, start, end, kind):
+    for _kind, _start, _end in _atoms(data, start, end):
+        if _kind == kind:
+            return _start, _end
+    return None
+
+
+def _mp4_data_value(data, start, end):
+    _data = _find_atom(data, start, end, b'data')
+    if not _data:
+        return None
+    # 4 bytes type indicator + 4 bytes locale
+    return bytes(data[_data[0] + 8:_data[1]]).decode('utf-8') or None
+
+
+def _read_mp4_meta(data, start, end):
+    # 'meta' is a full box in iTunes-style files, a plain container in QuickTime-style files
+    _children = (b'hdlr', b'keys', b'ilst')
+    if data[start + 4:start + 8] not in _children and data[start + 8:start + 12] in _children:
+        start = start + 4
+    keys = []
+    _keys = _find_atom(data, start, end, b'keys')
+    if _keys:
+        count = struct.unpack('>I', data[_keys[0] + 4:_keys[0] + 8])[0]
+        offset = _keys[0] + 8
+        for _ in range(count):
+            key_size = struct.unpack('>I', data[offset:offset + 4])[0]
+            keys.append(bytes(data[offset + 8:offset + key_size]).decode('utf-8'))
+            offset = offset + key_size
+
+    _ilst = _find_atom(data, start, end, b'ilst')
+    if not _ilst:
+        return None
+    for kind, _start, _end in _atoms(data, _ilst[0], _ilst[1]):
+        if kind == b'----':
+            _name = _find_atom(data, _start, _end, b'name')
+            if _name and bytes(data[_name[0] + 4:_name[1]]).decode('utf-8').lower() == PURL_KEY:
+                return _mp4_data_value(data, _start, _end)
+        elif kind == PURL_KEY.encode():
+            return _mp4_data_value(data, _start, _end)
+        elif keys:
+            index = struct.unpack('>I', kind)[0]
+            if 0 < index <= len(keys) and keys[index - 1].split('.')[-1].lower() == PURL_KEY:
+                return _mp4_data_value(data, _start, _end)
+    return None
+
+
+def _read_mp4(data):
+    _moov = _find_atom(data, 0, len(data), b'moov')
+    if not _moov:
+        raise UnsupportedFormat('moov atom not found')
+    containers = [_moov]
+    _udta = _find_atom(data, _moov[0], _moov[1], b'udta')
+    if _udta:
+        containers.insert(0, _udta)
+    for start, end in containers:
+        _meta = _find_atom(data, start, end, b'meta')
+        if _meta:
+            url = _read_mp4_meta(data, _meta[0], _meta[1])
+            if url:
+                return url
+    return None
+
+
+def _ogg_packets(data):
+    """
+    Yield packets of the first logical bitstream in Ogg file
+    """
+    offset = 0
+    serial = None
+    # Segments of packet spanning pages, joined once packet ends
+    parts = []
+    while data[offset:offset + 4] == b'OggS':
+        segment_count = data[offset + 26]
+        page_serial = struct.unpack('<I', data[offset + 14:offset + 18])[0]
+        segments = data[offset + 27:offset + 27 + segment_count]
+        body = offset + 27 + segment_count
+        if serial is None:
+            serial = page_serial
+        if page_serial != serial:
+            offset = body + sum(segments)
+            continue
+        start = body
+        for lacing in segments:
+            body = body + lacing
+            if lacing < 255:
+                parts.append(data[start:body])
+                yield b''.join(parts)
+                parts = []
+                start = body
+        if body > start:
+            parts.append(data[start:body])
+        offset = body
+
+
+def _read_ogg(data):
+    for index, packet in enumerate(_ogg_packets(data)):
+        if packet.startswith(b'\x03vorbis'):
+            offset = 7
+        elif packet.startswith(b'OpusTags'):
+            offset = 8
+        elif index >= 1:
+            break
+        else:
+            continue
+        vendor_length = struct.unpack('<I', packet[offset:offset + 4])[0]
+        offset = offset + 4 + vendor_length
+        count = struct.unpack('<I', packet[offset:offset + 4])[0]
+        offset = offset + 4
+        for _ in range(count):
+            length = struct.unpack('<I', packet[offset:offset + 4])[0]
+            comment = packet[offset + 4:offset + 4 + length].decode('utf-8')
+            offset = offset + 4 + length
+            key, _, value = comment.partition('=')
+            if key.lower() == PURL_KEY:
+                return value or None
+        return None
+    raise UnsupportedFormat('Ogg comment header not found')
@@ -0,0 +1,344 @@
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePath
+
+
+class Transcoder:
+    """
+    Transcoding stage of pipeline mode. youtube-dl only downloads best audio
+    stream (and thumbnail) into a staging directory; each downloaded title is
+    transcoded, tagged and given its thumbnail by a single ffmpeg process and
+    moved into output directory. Up to `workers` ffmpeg processes (default: no.
+    of CPUs) run at a time, while youtube-dl continues downloading. With media
+    cache, thumbnails and metadata are taken from (and added to) cache; youtube-dl
+    doesn't write thumbnails and missing thumbnails are fetched once into cache.
+
+    Without pipeline mode, a transcoder with media cache only embeds cached
+    thumbnails into titles converted by youtube-dl (see submit_thumbnail()).
+    """
+
+    STAGING_DIRECTORY = '.yt-audio-staging'
+
+    # audio format: (ffmpeg codec, file extension)
+    CODECS = {'mp3': ('libmp3lame', 'mp3'), 'aac': ('aac', 'm4a'), 'm4a': ('aac', 'm4a'),
+              'opus': ('libopus', 'opus'), 'vorbis': ('libvorbis', 'ogg'),
+              'flac': ('flac', 'flac'), 'wav': ('pcm_s16le', 'wav')}
+
+    # Extensions of source streams copied as-is with audio format 'best'
+    COPY_EXTENSIONS = {'m4a': 'm4a', 'mp3': 'mp3', 'webm': 'opus', 'opus': 'opus', 'ogg': 'ogg'}
+
+    # Formats thumbnail can be embedded into (as attached picture)
+    THUMBNAIL_EXTENSIONS = ('mp3', 'm4a')
+    IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp')
+
+    # youtube-dl arguments handled by transcoding stage
+    FLAG_ARGS = ('-x', '--extract-audio', '--add-metadata', '--embed-thumbnail')
+    VALUE_ARGS = ('--audio-format', '--audio-quality', '--download-archive')
+
+    def __init__(self, common, audio_format='best', audio_quality='5', add_metadata=False,
+                 embed_thumbnail=False, workers=0, media_cache=None):
+        if audio_format != 'best' and audio_format not in self.CODECS:
+            raise ValueError("Audio format '{0}' is not supported in pipeline mode".format(
+                audio_format))
+        self.common = common
+        self.audio_format = audio_format
+        self.audio_quality = audio_quality
+        self.add_metadata = add_metadata
+        self.embed_thumbnail = embed_thumbnail
+        self.workers = workers or os.cpu_count() or 1
+        self.media_cache = media_cache
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    @classmethod
+    def from_download_command(cls, common, command, workers=0, media_cache=None):
+        """
+        Create transcoder with audio format/quality/metadata/thumbnail options
+        of youtube-dl download command
+        """
+        tokens = command.split(' ')
+        _options = {}
+        for arg, key in (('--audio-format', 'audio_format'), ('--audio-quality', 'audio_quality')):
+            if arg in tokens and tokens.index(arg) + 1 < len(tokens):
+                _options[key] = tokens[tokens.index(arg) + 1]
+        return cls(common, add_metadata='--add-metadata' in tokens,
+                   embed_thumbnail='--embed-thumbnail' in tokens, workers=workers,
+                   media_cache=media_cache, **_options)
+
+    def download_command(self, command):
+        """
+        Convert youtube-dl download command to download best audio stream only
+        (audio extraction, metadata and thumbnail embedding are done by transcoder).
+        Archive file is not passed to youtube-dl; title(s) are recorded after transcoding.
+        """
+        for arg in self.VALUE_ARGS:
+            command = re.sub(r' {0} +\S+'.format(re.escape(arg)), '', command)
+        _tokens = [x for x in command.split(' ') if x not in self.FLAG_ARGS]
+        _extra = []
+        if '-f' not in _tokens and '--format' not in _tokens:
+            _extra.append('-f bestaudio/best')
+        if self.embed_thumbnail and not self.media_cache and '--write-thumbnail' not in _tokens:
+            _extra.append('--write-thumbnail')
+        if _extra:
+            _tokens.insert(1, ' '.join(_extra))
+        return ' '.join(_tokens)
+
+    @classmethod
+    def staging_path(cls, directory):
+        return str(PurePath(directory, cls.STAGING_DIRECTORY))
+
+    @classmethod
+    def remove_staging(cls, directory):
+        """
+        Remove staging directory of output directory (if empty)
+        """
+        try:
+            os.rmdir(cls.staging_path(directory))
+        except OSError:
+            pass
+
+    def submit(self, info, directory, progress, on_done, playlist=''):
+        """
+        Queue downloaded title for transcoding (timed in 'transcode' metrics phase)
+
+        Parameters:
+        ==========
+        > info (dict): youtube-dl --print-json info of downloaded title
+
+        > directory (string): Output directory
+
+        > progress (dict): download progress (title is counted as failed if transcoding fails)
+
+        > on_done (function): on_done(info) called with info of transcoded file
+
+        > playlist (string)(optional): Playlist/URL of title (metrics)
+
+        Returns:
+        =======
+        > (concurrent.futures.Future) transcoding job
+        """
+        return self.executor.submit(self._run, info, directory, progress, on_done, playlist)
+
+    def submit_thumbnail(self, info, progress, on_done, playlist=''):
+        """
+        Queue embedding of cached thumbnail into title converted by youtube-dl
+        (timed in 'transcode' metrics phase)
+
+        Parameters:
+        ==========
+        > info (dict): youtube-dl --print-json info of downloaded title (with filepath)
+
+        > progress (dict): download progress
+
+        > on_done (function): on_done(info) called once thumbnail is embedded
+        (title is kept and reported without thumbnail if embedding fails)
+
+        > playlist (string)(optional): Playlist/URL of title (metrics)
+
+        Returns:
+        =======
+        > (concurrent.futures.Future) embedding job
+        """
+        return self.executor.submit(self._run_thumbnail, info, progress, on_done, playlist)
+
+    def _run_thumbnail(self, info, progress, on_done, playlist=''):
+        with self.common.metrics.phase('transcode', playlist) as _phase:
+            try:
+                _phase['items'] = int(self.embed_cached_thumbnail(info))
+            except Exception as ex:
+                _phase['failed'] = 1
+                with progress['lock']:
+                    self.common.log('{0}: thumbnail not embedded: {1}'.format(
+                        info.get('title'), str(ex)), 'warning')
+        on_done(info)
+
+    def embed_cached_thumbnail(self, info):
+        """
+        Embed thumbnail from media cache (fetched on cache miss) into downloaded title
+
+        Returns:
+        =======
+        > (bool) True if thumbnail was embedded
+        """
+        _path = info.get('filepath')
+        _ext = Path(_path).suffix.lstrip('.').lower() if _path else ''
+        if _ext not in self.THUMBNAIL_EXTENSIONS or not info.get('id'):
+            return False
+        _extractor = info.get('extractor_key') or info.get('extractor') or 'youtube'
+        _key = (_extractor.lower(), info['id'])
+        _thumbnail = self.cached_thumbnail(_key, self.media_cache.merge_info(_key, info))
+        if not _thumbnail:
+            return False
+        _temp = Path(_path).with_name(Path(_path).stem + '.thumbnail.' + _ext)
+        command = [self.common.require('ffmpeg'), '-y', '-loglevel', 'error', '-i', _path,
+                   '-i', _thumbnail, '-map', '0:a', '-map', '1:0', '-c:a', 'copy',
+                   '-c:v', 'mjpeg', '-disposition:v', 'attached_pic']
+        if _ext == 'mp3':
+            command = command + ['-id3v2_version', '3']
+        command.append(str(_temp))
+        self._run_ffmpeg(command, _temp)
+        os.replace(str(_temp), _path)
+        return True
+
+    @staticmethod
+    def _run_ffmpeg(command, output):
+        """
+        Run ffmpeg command writing output file (removed if ffmpeg fails)
+        """
+        process = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            if output.exists():
+                output.unlink()
+            raise RuntimeError(process.stderr.decode('utf-8', 'replace').strip()
+                               or 'ffmpeg exited with {0}'.format(process.returncode))
+
+    def _run(self, info, directory, progress, on_done, playlist=''):
+        with self.common.metrics.phase('transcode', playlist) as _phase:
+            try:
+                _path = self.transcode(info, directory)
+            except Exception as ex:
+                _phase['failed'] = 1
+                with progress['lock']:
+                    progress['count'] = progress['count'] - 1
+                    self.common.log('{0}: transcoding failed: {1}'.format(
+                        info.get('title'), str(ex)), 'error')
+                return
+            _phase['items'] = 1
+        _info = dict(info)
+        _info['filepath'] = _info['_filename'] = _path
+        on_done(_info)
+
+    def transcode(self, info, directory):
+        """
+        Transcode downloaded title into output directory
+
+        Returns:
+        =======
+        > (string) Output file path
+        """
+        # filepath: file reported by youtube-dl once downloaded (see engine.DONE_MARKER)
+        _source = info.get('filepath') or info.get('_filename')
+        if not _source or not os.path.isfile(_source):
+            raise FileNotFoundError('Downloaded file not found: {0}'.format(_source))
+        _staging = self.staging_path(directory)
+        _relative = Path(os.path.relpath(_source, _staging))
+        _source_ext = _relative.suffix.lstrip('.').lower()
+        if self.audio_format == 'best' and _source_ext in self.COPY_EXTENSIONS:
+            _codec, _ext = 'copy', self.COPY_EXTENSIONS[_source_ext]
+        else:
+            _codec, _ext = self.CODECS.get(self.audio_format, self.CODECS['mp3'])
+        _destination = Path(directory, _relative).with_suffix('.' + _ext)
+        _temp = Path(_staging, _relative).with_suffix('.transcoded.' + _ext)
+        _written = self.find_thumbnail(info, _source)
+        _thumbnail = _written
+        if self.media_cache and info.get('id'):
+            _extractor = info.get('extractor_key') or info.get('extractor') or 'youtube'
+            _key = (_extractor.lower(), info['id'])
+            info = self.media_cache.merge_info(_key, info)
+            if self.embed_thumbnail:
+                _thumbnail = self.cached_thumbnail(_key, info, _written)
+
+        command = [self.common.require('ffmpeg'), '-y', '-loglevel', 'error', '-i', _source]
+        if _thumbnail and _ext in self.THUMBNAIL_EXTENSIONS:
+            command = command + ['-i', _thumbnail, '-map', '0:a', '-map', '1:0',
+                                 '-c:v', 'mjpeg', '-disposition:v', 'attached_pic']
+        else:
+            command = command + ['-map', '0:a', '-vn']
+        command = command + ['-c:a', _codec] + self.quality_args(_codec)
+        if self.add_metadata:
+            for key, value in self.metadata(info):
+                command = command + ['-metadata', '{0}={1}'.format(key, value)]
+        if _ext == 'mp3':
+            command = command + ['-id3v2_version', '3']
+        command.append(str(_temp))
+
+        self._run_ffmpeg(command, _temp)
+        _destination.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(str(_temp), str(_destination))
+        for path in (_source, _written):
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return str(_destination)
+
+    def cached_thumbnail(self, key, info, written=None):
+        """
+        Get thumbnail of title from media cache. Thumbnail written by youtube-dl
+        is added to cache; otherwise it is fetched into cache from info's
+        thumbnail URL on cache miss.
+
+        Returns:
+        =======
+        > (string) Thumbnail path or None
+        """
+        _path = self.media_cache.get_thumbnail(key)
+        if _path:
+            return _path
+        if written:
+            try:
+                return self.media_cache.put_thumbnail(key, written)
+            except OSError:
+                return written
+        _path = self.media_cache.fetch_thumbnail(key, info.get('thumbnail'))
+        if not _path and info.get('thumbnail'):
+            self.common.log('{0}: unable to fetch thumbnail'.format(info.get('title')), 'warning')
+        return _path
+
+    def quality_args(self, codec):
+        """
+        Get ffmpeg quality arguments (same mapping as youtube-dl: quality < 10
+        is VBR quality, otherwise bitrate in kbps)
+        """
+        if codec in ('copy', 'flac', 'pcm_s16le') or not self.audio_quality:
+            return []
+        _quality = self.audio_quality.rstrip('kK')
+        try:
+            if float(_quality) < 10:
+                if codec == 'libopus':
+                    return []
+                return ['-q:a', _quality]
+        except ValueError:
+            return []
+        return ['-b:a', _quality + 'k']
+
+    @staticmethod
+    def metadata(info):
+        """
+        Get metadata of title (same fields as youtube-dl's --add-metadata)
+
+        Returns:
+        =======
+        > (list) (key, value) tuple(s)
+        """
+        _fields = (('title', ('track', 'title')), ('date', ('upload_date',)),
+                   ('description', ('description',)), ('comment', ('description',)),
+                   ('purl', ('webpage_url',)), ('track', ('track_number',)),
+                   ('artist', ('artist', 'creator', 'uploader', 'uploader_id')),
+                   ('genre', ('genre',)), ('album', ('album',)),
+                   ('album_artist', ('album_artist',)), ('disc', ('disc_number',)))
+        _metadata = []
+        for key, sources in _fields:
+            for source in sources:
+                if info.get(source) is not None:
+                    _metadata.append((key, info[source]))
+                    break
+        return _metadata
+
+    @classmethod
+    def find_thumbnail(cls, info, source):
+        """
+        Get path of thumbnail written by youtube-dl (--write-thumbnail) for title
+        """
+        for thumbnail in info.get('thumbnails') or []:
+            if thumbnail.get('filename') and os.path.isfile(thumbnail['filename']):
+                return thumbnail['filename']
+        _source = Path(source)
+        for suffix in cls.IMAGE_SUFFIXES:
+            _path = _source.with_suffix(suffix)
+            if _path.is_file():
+                return str(_path)
+        return None